@@ -0,0 +1,96 @@
+"""Synthetic Grarkdown documents for benchmarks.
+
+Run from the repository root to write one to a file:
+
+    python -m benchmarks.generator --nodes 5000 --fanout 3 --cluster-depth 2 -o big.md
+
+The same arguments and seed always produce the same document.
+"""
+import argparse
+import random
+from typing import Optional
+
+COLORS = ("#1976D2", "#388E3C", "#F57C00", "#7B1FA2", "#455A64")
+STYLES = ("solid", "dashed", "bold", "dotted")
+TYPES = ("int", "string", "float", "bool", "datetime", "List[str]")
+KEYWORDS = ("TO", "TO", "TO", "FROM", "BI")   # Mostly TO, like hand-written models
+
+
+def generate_document(nodes: int = 1000, variables: int = 4, functions: int = 2,
+                      fanout: float = 2.0, clusters: int = 10, cluster_depth: int = 1,
+                      image_ratio: float = 0.0, image_base_url: Optional[str] = None,
+                      distinct_images: int = 10, seed: int = 0) -> str:
+    """A document with controllable size and shape.
+
+    fanout is the average number of relations per node; they point mostly to
+    nearby nodes so the graph is connected without being a hairball. Nodes are
+    spread over clusters nested cluster_depth levels deep (0 for none). A
+    share image_ratio of the nodes show one of distinct_images images from
+    image_base_url, which must be set when image_ratio > 0.
+    """
+    if image_ratio > 0 and not image_base_url:
+        raise ValueError("image_base_url is required when image_ratio > 0")
+    rng = random.Random(seed)
+    blocks = []
+    for i in range(nodes):
+        lines = [f"# {{Entity {i}}} [n{i}]"]
+        if i % 3 == 0:
+            lines.append(f"### OPT COLOR {rng.choice(COLORS).lstrip('#')}")
+        lines.append("### OPT CLASS entity")
+        if cluster_depth > 0 and clusters > 0:
+            cluster = i % clusters
+            path = ">".join(f"L{level}_{cluster // (2 ** (cluster_depth - 1 - level))}"
+                            for level in range(cluster_depth))
+            lines.append(f"### OPT CLUSTER {path} [style=rounded]")
+        if image_ratio > 0 and rng.random() < image_ratio:
+            lines.append(f"### OPT IMAGE {image_base_url.rstrip('/')}/{rng.randrange(distinct_images)}.png"
+                         f"?width=1&height=1")
+        if variables:
+            lines.append("## VAR")
+            lines.extend(f"- field{v}: {rng.choice(TYPES)}" for v in range(variables))
+            lines.append("## END VAR")
+        if functions:
+            lines.append("## FUNC")
+            lines.extend(f"- method{f}(arg: {rng.choice(TYPES)}) -> {rng.choice(TYPES)}" for f in range(functions))
+            lines.append("## END FUNC")
+
+        # int(fanout) or one more so the mean is fanout; targets mostly close by
+        count = int(fanout) + (1 if rng.random() < fanout - int(fanout) else 0)
+        if count and nodes > 1:
+            lines.append("## F_RELA")
+            for _ in range(count):
+                target = (i + int(rng.expovariate(0.1)) + 1) % nodes if rng.random() < 0.8 else rng.randrange(nodes)
+                if target == i:
+                    target = (i + 1) % nodes
+                lines.append(f"- {rng.choice(KEYWORDS)} [n{target}] {{rel{rng.randrange(20)}}} "
+                             f"[style={rng.choice(STYLES)}, color={rng.choice(COLORS)}]")
+            lines.append("## END F_RELA")
+        blocks.append("\n".join(lines) + "\n")
+    return "\n".join(blocks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Grarkdown document")
+    parser.add_argument("--nodes", type=int, default=1000, help="Number of nodes (default: 1000)")
+    parser.add_argument("--variables", type=int, default=4, help="VAR entries per node (default: 4)")
+    parser.add_argument("--functions", type=int, default=2, help="FUNC entries per node (default: 2)")
+    parser.add_argument("--fanout", type=float, default=2.0, help="Average relations per node (default: 2)")
+    parser.add_argument("--clusters", type=int, default=10, help="Number of innermost clusters (default: 10)")
+    parser.add_argument("--cluster-depth", type=int, default=1, help="Cluster nesting depth, 0 for none (default: 1)")
+    parser.add_argument("--image-ratio", type=float, default=0.0, help="Share of nodes with an image (default: 0)")
+    parser.add_argument("--image-base-url", default=None, help="Base URL the images are served from")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--output", "-o", default=None, help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    document = generate_document(args.nodes, args.variables, args.functions, args.fanout, args.clusters,
+                                 args.cluster_depth, args.image_ratio, args.image_base_url, seed=args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(document)
+    else:
+        print(document, end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""A local HTTP stand-in for the image CDNs diagrams point to.
+
+Serves a small generated PNG for any ``/<n>.png`` path, with an ETag so the
+image cache's revalidation works like against a real server:
+
+    with ImageServer(delay=0.02) as server:
+        document = generate_document(image_ratio=0.2, image_base_url=server.url)
+"""
+import hashlib
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_png(seed: int, size: int = 64) -> bytes:
+    """A valid size x size RGB PNG with a colour derived from seed."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    color = hashlib.sha256(str(seed).encode()).digest()[:3]
+    rows = b"".join(b"\x00" + color * size for _ in range(size))
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows))
+            + chunk(b"IEND", b""))
+
+
+class ImageServer:
+    """Threaded HTTP server on a free localhost port, run in the background.
+
+    delay adds latency to every request, to mimic a remote server. requests
+    counts the requests served, 304s included.
+    """
+
+    def __init__(self, delay: float = 0.0, size: int = 64):
+        self.delay = delay
+        self.size = size
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._images = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                if server.delay:
+                    time.sleep(server.delay)
+                name = self.path.split("?")[0].strip("/")
+                if not name.endswith(".png") or not name[:-4].isdigit():
+                    self.send_error(404)
+                    return
+                body = server.image(int(name[:-4]))
+                etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = None
+
+    def image(self, number: int) -> bytes:
+        with self._lock:
+            if number not in self._images:
+                self._images[number] = make_png(number, self.size)
+            return self._images[number]
+
+    def start(self) -> "ImageServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    def __enter__(self) -> "ImageServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
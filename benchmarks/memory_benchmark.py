@@ -0,0 +1,60 @@
+"""Memory used by a parsed diagram, measured with tracemalloc.
+
+Run from the repository root:
+
+    python -m benchmarks.memory_benchmark --nodes 10000 --fanout 10
+
+Parses a generated model once with relations as Relation objects and once
+with the columnar RelationStore, and reports the memory each keeps alive.
+"""
+import argparse
+import gc
+import tracemalloc
+from src.parser.markdown_parser import parse_markdown
+
+
+def generate_model(nodes: int, fanout: int) -> str:
+    """A model with repeated styles, classes, labels and cluster names."""
+    blocks = []
+    for i in range(nodes):
+        relations = "\n".join(
+            f"- TO [n{(i * 7 + j * 13) % nodes}] {{calls}} [style=dashed, color=#1976D2, class=edge]"
+            for j in range(fanout)
+        )
+        blocks.append(
+            f"# {{Node {i}}} [n{i}]\n"
+            f"### OPT CLASS entity\n"
+            f"### OPT CLUSTER Platform>Team{i % 20} [style=rounded]\n"
+            f"## VAR\n- id: int\n## END VAR\n"
+            f"## F_RELA\n{relations}\n## END F_RELA\n"
+        )
+    return "\n".join(blocks)
+
+
+def measure(markdown_text: str, compact_relations: bool):
+    gc.collect()
+    tracemalloc.start()
+    diagram = parse_markdown(markdown_text, compact_relations=compact_relations)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return diagram, retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory of a parsed Grarkdown model")
+    parser.add_argument("--nodes", type=int, default=10000, help="Number of nodes (default: 10000)")
+    parser.add_argument("--fanout", type=int, default=10, help="Relations per node (default: 10)")
+    args = parser.parse_args()
+
+    markdown_text = generate_model(args.nodes, args.fanout)
+    print(f"{args.nodes} nodes, {args.nodes * args.fanout} relations")
+    for label, compact in (("objects", False), ("columnar", True)):
+        diagram, retained, peak = measure(markdown_text, compact)
+        print(f"{label:>9}: retained {retained / 2**20:7.1f} MiB, "
+              f"{retained / len(diagram.relations):6.0f} B/relation, peak {peak / 2**20:7.1f} MiB")
+        del diagram
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Time each phase of a render on generated documents.
+
+Run from the repository root:
+
+    python -m benchmarks.render_benchmark --scenarios small,medium --save-baseline baseline.json
+    python -m benchmarks.render_benchmark --scenarios small,medium --baseline baseline.json
+
+Phases are timed separately: parse_markdown, the image prefetch (against a
+local server, with an empty cache each time), writing the DOT source
+(get_dot), the Graphviz pipe and the SVG post-processing. render_diagram
+streams the last three into each other; here each one's output is buffered
+first so each gets its own time. The Graphviz phases are skipped when
+Graphviz is not installed.
+
+With --baseline, any phase slower than the baseline by more than --tolerance
+(and by more than a few milliseconds of noise) is reported and the exit
+code is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import graphviz
+from benchmarks.generator import generate_document
+from benchmarks.image_server import ImageServer
+from src.parser.markdown_parser import parse_markdown
+from src.renderer.dot_writer import DotSource
+from src.renderer.graphviz_process import pipe_stream
+from src.renderer.graphviz_renderer import prefetch_images
+from src.renderer.image_cache import ImageCache
+from src.renderer.svg_postprocess import write_svg
+
+PHASES = ("parse", "images", "get_dot", "graphviz", "postprocess")
+NOISE_FLOOR = 0.005   # Seconds; smaller differences are never regressions
+
+# generate_document arguments of each named scenario
+SCENARIOS = {
+    "small": dict(nodes=100, fanout=2, cluster_depth=1, clusters=5, image_ratio=0.1),
+    "medium": dict(nodes=2000, fanout=2, cluster_depth=2, clusters=20, image_ratio=0.02),
+    "large": dict(nodes=20000, fanout=3, cluster_depth=3, clusters=64, image_ratio=0.005),
+    "dense": dict(nodes=1000, fanout=10, cluster_depth=1, clusters=10),
+    "wide": dict(nodes=1000, variables=40, functions=20, fanout=1, cluster_depth=0),
+    "images": dict(nodes=500, fanout=1, cluster_depth=1, clusters=10, image_ratio=1.0, distinct_images=50),
+}
+
+
+def run_scenario(params: dict, server: ImageServer, repeat: int, engine: str, graphviz_ok: bool) -> Dict[str, dict]:
+    """Median and min seconds of each phase over repeat runs, plus the model size."""
+    document = generate_document(image_base_url=server.url, **params)
+    times: Dict[str, List[float]] = {phase: [] for phase in PHASES}
+    options = {"engine": engine}
+    diagram = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for run in range(repeat):
+            start = time.perf_counter()
+            diagram = parse_markdown(document)
+            times["parse"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            image_paths = prefetch_images(diagram, ImageCache(os.path.join(tmp, f"images{run}")))
+            times["images"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            dot = DotSource(diagram, options, image_paths)
+            source = dot.source
+            times["get_dot"].append(time.perf_counter() - start)
+
+            if not graphviz_ok:
+                continue
+            start = time.perf_counter()
+            chunks = list(pipe_stream(source, dot.engine, "svg"))
+            times["graphviz"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            write_svg(chunks, os.path.join(tmp, "out.svg"), diagram.inline_stylesheet)
+            times["postprocess"].append(time.perf_counter() - start)
+
+    result = {phase: {"median": statistics.median(values), "min": min(values)}
+              for phase, values in times.items() if values}
+    result["size"] = {"nodes": len(diagram.nodes), "relations": len(diagram.relations),
+                      "document_bytes": len(document.encode("utf-8"))}
+    return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Phases slower than in the baseline, as printable lines."""
+    regressions = []
+    for name, phases in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        for phase in PHASES:
+            if phase not in phases or phase not in before:
+                continue
+            old, new = before[phase]["median"], phases[phase]["median"]
+            if new > old * (1 + tolerance) and new - old > NOISE_FLOOR:
+                regressions.append(f"{name}/{phase}: {old * 1000:.1f} ms -> {new * 1000:.1f} ms "
+                                   f"(+{(new / old - 1) * 100 if old else float('inf'):.0f}%)")
+    return regressions
+
+
+def print_table(results: dict, baseline: Optional[dict]):
+    print(f"{'scenario':<12}{'nodes':>7}{'rels':>8}" + "".join(f"{phase:>13}" for phase in PHASES))
+    for name, phases in results["scenarios"].items():
+        size = phases["size"]
+        row = f"{name:<12}{size['nodes']:>7}{size['relations']:>8}"
+        for phase in PHASES:
+            if phase not in phases:
+                row += f"{'-':>13}"
+                continue
+            cell = f"{phases[phase]['median'] * 1000:.1f}ms"
+            before = (baseline or {}).get("scenarios", {}).get(name, {}).get(phase)
+            if before and before["median"]:
+                cell += f" {(phases[phase]['median'] / before['median'] - 1) * 100:+.0f}%"
+            row += f"{cell:>13}"
+        print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each phase of a Grarkdown render on generated documents")
+    parser.add_argument("--scenarios", default="small,medium",
+                        help=f"Comma-separated scenarios among {', '.join(SCENARIOS)} (default: small,medium)")
+    parser.add_argument("--scale", default=None,
+                        help="Comma-separated node counts: also run the medium scenario at each size")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario; the median is reported (default: 3)")
+    parser.add_argument("--engine", default="auto", help="Layout engine for the Graphviz phase (default: auto)")
+    parser.add_argument("--image-delay", type=float, default=0.01, help="Latency of the local image server in seconds (default: 0.01)")
+    parser.add_argument("--no-graphviz", action="store_true", help="Skip the Graphviz and post-processing phases")
+    parser.add_argument("--baseline", default=None, help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline (default: 0.2 = 20%%)")
+    parser.add_argument("--save-baseline", default=None, help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    scenarios = {}
+    for name in filter(None, args.scenarios.split(",")):
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario '{name}'")
+        scenarios[name] = SCENARIOS[name]
+    for nodes in filter(None, (args.scale or "").split(",")):
+        scenarios[f"scale-{nodes}"] = dict(SCENARIOS["medium"], nodes=int(nodes))
+
+    graphviz_ok = not args.no_graphviz
+    if graphviz_ok:
+        try:
+            graphviz_version = ".".join(map(str, graphviz.version()))
+        except graphviz.ExecutableNotFound:
+            print("Graphviz not found: skipping the graphviz and postprocess phases", file=sys.stderr)
+            graphviz_ok = False
+    results = {
+        "python": platform.python_version(),
+        "graphviz": graphviz_version if graphviz_ok else None,
+        "engine": args.engine,
+        "repeat": args.repeat,
+        "scenarios": {},
+    }
+    with ImageServer(delay=args.image_delay) as server:
+        for name, params in scenarios.items():
+            results["scenarios"][name] = run_scenario(params, server, args.repeat, args.engine, graphviz_ok)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.save_baseline}")
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No phase slower than the baseline by more than {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
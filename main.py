@@ -1,39 +1,191 @@
 import argparse
+import json
 import os
-from src.parser.markdown_parser import parse_markdown
-from src.renderer.graphviz_renderer import render_diagram, get_dot
+import sys
+from src.lint import ERROR, check_file
+from src.profiling import Profile
+from src.server import serve
+from src.pipeline import discover_documents, parse_formats, render_file, render_batch, watch_file
+from src.renderer.graphviz_renderer import AUTO_MAX_EDGES, AUTO_MAX_NODES, ENGINES
+from src.renderer.image_cache import ImageCache
+from src.renderer.layout_positions import LayoutPositions
+from src.renderer.render_cache import RenderCache
+
+def check(paths):
+    """Prints every issue found in paths; returns 1 if any of them is an error."""
+    errors = 0
+    warnings = 0
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"Error: The file '{path}' does not exist.")
+            errors += 1
+            continue
+        for issue in check_file(path):
+            print(issue.format(path))
+            if issue.severity == ERROR:
+                errors += 1
+            else:
+                warnings += 1
+    print(f"{len(paths)} file(s) checked: {errors} error(s), {warnings} warning(s)")
+    return 1 if errors else 0
 
 def main():
     parser = argparse.ArgumentParser(description="Convert Markdown to Graphviz Diagram")
 
-    parser.add_argument("file", help="Markdown file to process")
-    parser.add_argument("--output", "-o", default="output_diagram", help="Output file name without extension (default: output_diagram)")
-    parser.add_argument("--format", "-f", choices=["svg", "dot"], default="svg", help="Output format (default: svg)")
+    parser.add_argument("file", nargs="?", help="Markdown file to process")
+    parser.add_argument("--output", "-o", default=None, help="Output file name without extension (default: output_diagram). With --batch, the output directory (default: next to each source)")
+    parser.add_argument("--format", "-f", default="svg", help="Output format, or several separated by commas: svg, png, pdf, dot (default: svg). Graphviz lays the diagram out once for all of them")
     parser.add_argument("--rankdir", default="LR", help="Graph rank direction (default: LR)")
     parser.add_argument("--nodesep", default="0.6", help="Node separation (default: 0.6)")
     parser.add_argument("--ranksep", default="0.7", help="Rank separation (default: 0.7)")
+    parser.add_argument("--engine", "-e", choices=list(ENGINES) + ["auto"], default="dot", help="Graphviz layout engine; auto uses dot for small diagrams and sfdp for large ones (default: dot)")
+    parser.add_argument("--auto-max-nodes", type=int, default=AUTO_MAX_NODES, help=f"Most nodes --engine auto lays out with dot (default: {AUTO_MAX_NODES})")
+    parser.add_argument("--auto-max-edges", type=int, default=AUTO_MAX_EDGES, help=f"Most relations --engine auto lays out with dot (default: {AUTO_MAX_EDGES})")
+    parser.add_argument("--mclimit", type=float, default=None, help="dot: scale of the crossing minimization iterations (lower is faster)")
+    parser.add_argument("--nslimit", type=float, default=None, help="dot: scale of the network simplex iterations (lower is faster)")
+    parser.add_argument("--searchsize", type=int, default=None, help="dot: edges searched for a cut value improvement (default in Graphviz: 30)")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds a layout may take before it is retried with a cheaper engine (dot/neato/fdp -> sfdp -> osage)")
+    parser.add_argument("--focus", metavar="KEYS", default=None, help="Comma-separated node keys: only draw them and the nodes around them (see --focus-depth and --direction)")
+    parser.add_argument("--focus-depth", "--depth", type=int, default=1, help="With --focus, how many relations away from the keys nodes are drawn (default: 1)")
+    parser.add_argument("--direction", choices=["in", "out", "both"], default="both", help="With --focus, follow relations leaving the keys (out), reaching them (in) or both (default: both)")
+    parser.add_argument("--max-depth", metavar="N", type=int, default=None, help="Draw clusters nested deeper than N levels as one summary node each, with their relations merged into weighted edges (0 collapses every cluster)")
+    parser.add_argument("--collapse", metavar="CLUSTERS", default=None, help="Comma-separated clusters to draw as summary nodes, written as in OPT CLUSTER (e.g. Platform>Billing)")
+    parser.add_argument("--compact", action="store_true", help="Only show the name and key of each node, without its VAR and FUNC sections")
+    parser.add_argument("--positions", metavar="FILE", default=None, help="Save the node positions of each render to FILE (JSON); with --engine neato or fdp, later renders start from them")
+    parser.add_argument("--pin", action="store_true", help="With --positions, keep known nodes at their saved position and only place the new ones")
+    parser.add_argument("--image-cache", default=None, help="Directory of the persistent image cache (default: ~/.cache/grarkdown/images)")
+    parser.add_argument("--image-cache-size", type=int, default=256, help="Maximum size of the image cache in MiB (default: 256)")
+    parser.add_argument("--offline", action="store_true", help="Only use images already in the cache, never download")
+    parser.add_argument("--image-workers", type=int, default=8, help="Maximum concurrent image downloads (default: 8)")
+    parser.add_argument("--image-dpi", type=float, default=None, help="Downscale embedded images to the size of their node at this resolution, e.g. 192 (needs Pillow; default: embed the original files)")
+    parser.add_argument("--render-cache", default=None, help="Directory of the Graphviz render cache (default: ~/.cache/grarkdown/renders)")
+    parser.add_argument("--render-cache-size", type=int, default=512, help="Maximum size of the render cache in MiB (default: 512)")
+    parser.add_argument("--no-cache", action="store_true", help="Always run Graphviz, ignoring the render cache")
+    parser.add_argument("--batch", metavar="DIR", default=None, help="Render every .md file under DIR instead of a single file")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Worker processes for --batch (default: CPU count)")
+    parser.add_argument("--parse-workers", metavar="N", type=int, default=None, help="Parse a very large file in chunks on N processes (0 for the CPU count)")
+    parser.add_argument("--split-components", action="store_true", help="Lay out disconnected parts of the diagram in parallel Graphviz processes and pack them into one SVG")
+    parser.add_argument("--layout-workers", type=int, default=None, help="Parallel Graphviz processes for --split-components (default: CPU count)")
+    parser.add_argument("--check", action="store_true", help="Only validate the file(s) (missing keys, duplicates...) without running Graphviz")
+    parser.add_argument("--profile", metavar="FILE", default=None, help="Write a JSON report of the time spent in each phase and the sizes involved to FILE (- for stdout)")
+    parser.add_argument("--serve", metavar="PORT", type=int, default=None, help="Run a render server on PORT instead of rendering a file (POST /render)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address the render server listens on (default: 127.0.0.1)")
+    parser.add_argument("--max-graphviz", type=int, default=None, help="Graphviz processes the render server runs at once (default: CPU count)")
+    parser.add_argument("--max-queue", type=int, default=32, help="Renders that may wait for a Graphviz process before the server answers 503 (default: 32)")
+    parser.add_argument("--watch", "-w", action="store_true", help="Keep running and re-render the file whenever it changes")
 
     args = parser.parse_args()
 
-    if not os.path.exists(args.file):
-        print(f"Error: The file '{args.file}' does not exist.")
-        return
+    if sum(x is not None for x in (args.file, args.batch, args.serve)) != 1:
+        parser.error("provide either a file, --batch DIR or --serve PORT")
+    if args.watch and args.batch:
+        parser.error("--watch works on a single file")
+    try:
+        formats = parse_formats(args.format)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.split_components and set(formats) - {"svg", "dot"}:
+        parser.error("--split-components only produces svg (and dot)")
+    if args.focus_depth < 0:
+        parser.error("--focus-depth must be 0 or more")
+    if args.max_depth is not None and args.max_depth < 0:
+        parser.error("--max-depth must be 0 or more")
+    if args.positions and (args.batch or args.serve is not None or args.split_components):
+        parser.error("--positions works on a single diagram laid out in one piece")
+    if args.image_dpi is not None and args.image_dpi <= 0:
+        parser.error("--image-dpi must be positive")
+    if args.parse_workers is not None and (args.batch or args.watch):
+        parser.error("--parse-workers works on a single render (--batch already uses one process per file)")
+    if args.profile and (args.batch or args.watch or args.check or args.serve is not None):
+        parser.error("--profile works on a single render")
+    try:
+        layout_positions = LayoutPositions(args.positions) if args.positions else None
+    except ValueError as e:
+        parser.error(str(e))
     options = {
         'rankdir': args.rankdir,
         'nodesep': args.nodesep,
-        'ranksep': args.ranksep
+        'ranksep': args.ranksep,
+        'engine': args.engine,
+        'auto_max_nodes': args.auto_max_nodes,
+        'auto_max_edges': args.auto_max_edges,
+        'mclimit': args.mclimit,
+        'nslimit': args.nslimit,
+        'searchsize': args.searchsize,
+        'layout_timeout': args.timeout,
+        'focus': args.focus,
+        'focus_depth': args.focus_depth,
+        'focus_direction': args.direction,
+        'max_depth': args.max_depth,
+        'collapse': args.collapse,
+        'compact_labels': args.compact,
+        'layout_positions': layout_positions,
+        'pin_positions': args.pin,
+        'image_workers': args.image_workers,
+        'image_dpi': args.image_dpi,
+        'split_components': args.split_components,
+        'layout_workers': args.layout_workers,
+        'parse_workers': args.parse_workers,
+        'render_cache': None if args.no_cache else RenderCache(args.render_cache, max_bytes=args.render_cache_size * 1024 * 1024),
     }
-    with open(args.file, "r", encoding="utf-8") as f:
-        markdown_text = f.read()
+    cache_settings = {
+        'cache_dir': args.image_cache,
+        'max_bytes': args.image_cache_size * 1024 * 1024,
+        'offline': args.offline,
+    }
+
+    if args.serve is not None:
+        options['image_cache'] = ImageCache(**cache_settings)
+        try:
+            serve(args.host, args.serve, options, args.max_graphviz or os.cpu_count() or 1, args.max_queue)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.batch and not os.path.isdir(args.batch):
+        print(f"Error: The directory '{args.batch}' does not exist.")
+        return 1
+
+    if args.check:
+        return check(discover_documents(args.batch) if args.batch else [args.file])
+
+    if args.batch:
+        failed = 0
+        total = 0
+        for source, diagram_paths, error in render_batch(args.batch, args.output, args.format, options, cache_settings, args.jobs):
+            total += 1
+            if error:
+                failed += 1
+                print(f"FAILED {source}: {error}")
+            else:
+                print(f"OK     {source} -> {', '.join(diagram_paths)}")
+        print(f"{total - failed}/{total} diagrams generated")
+        return 1 if failed else 0
+
+    if not os.path.exists(args.file):
+        print(f"Error: The file '{args.file}' does not exist.")
+        return
+    options['image_cache'] = ImageCache(**cache_settings)
     output_file = args.output or "output_diagram"
-    diagram = parse_markdown(markdown_text)
-    # Ajuste según el formato
-    if args.format == "dot":
-        diagram_path = f"{output_file}.dot"
-        with open(diagram_path, "w", encoding="utf-8") as dot_file:
-            dot_file.write(get_dot(diagram).source)  # exporta el DOT directamente
-    else:
-        diagram_path = render_diagram(diagram, output_file=output_file, options=options)
-    print(f"Diagram generated at: {diagram_path}")
+    if args.watch:
+        print(f"Watching '{args.file}' (Ctrl+C to stop)")
+        try:
+            watch_file(args.file, output_file, args.format, options)
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.profile:
+        options['profile'] = Profile()
+    diagram_paths = render_file(args.file, output_file, args.format, options)
+    # Keep stdout for the JSON report when it goes there
+    status = sys.stderr if args.profile == "-" else sys.stdout
+    print(f"Diagram generated at: {', '.join(diagram_paths)}", file=status)
+    if args.profile:
+        report = dict(options['profile'].report(), file=args.file, output=diagram_paths)
+        if args.profile == "-":
+            print(json.dumps(report, indent=2))
+        else:
+            with open(args.profile, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
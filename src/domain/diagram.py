@@ -1,19 +1,34 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 from src.domain.node import Node
 from src.domain.relation import Relation
+from src.domain.relation_store import RelationStore
 
 class Diagram:
-    def __init__(self):
+    def __init__(self, compact_relations: bool = False):
         self.nodes: Dict[str, Node] = {}
-        self.relations: List[Relation] = []
+        # Very large models can keep their edges in columnar arrays instead of objects
+        self.relations: Union[List[Relation], RelationStore] = RelationStore() if compact_relations else []
         self.stylesheet: Optional[str] = None
         self.inline_stylesheet: Optional[str] = None
+        # Bumped by every change made through the methods below, so indexes
+        # built from the diagram (see graph_index) can tell they are stale
+        self.version = 0
 
     def add_node(self, node: Node):
         self.nodes[node.key] = node
+        self.version += 1
 
     def add_relation(self, relation: Relation):
         self.relations.append(relation)
+        self.version += 1
+
+    def clear(self):
+        """Removes every node, relation and stylesheet, keeping the same object."""
+        self.nodes.clear()
+        self.relations.clear()
+        self.stylesheet = None
+        self.inline_stylesheet = None
+        self.version += 1
 
 
 
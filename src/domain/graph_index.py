@@ -0,0 +1,88 @@
+import threading
+import weakref
+from typing import Dict, Iterable, List, Optional, Set
+from src.domain.diagram import Diagram
+from src.domain.relation import Relation
+
+
+class GraphIndex:
+    """Outgoing and incoming adjacency of a Diagram, built in one pass over its relations.
+
+    Keys that relations mention but that have no node are indexed too, so
+    dangling references can be found from either side.
+    """
+
+    def __init__(self, diagram: Diagram):
+        self.diagram = diagram
+        self.outgoing: Dict[str, List[Relation]] = {}
+        self.incoming: Dict[str, List[Relation]] = {}
+        # Position of each outgoing relation in diagram.relations, to keep their order in subgraphs
+        self._outgoing_positions: Dict[str, List[int]] = {}
+        self._node_positions: Optional[Dict[str, int]] = None
+        self.version = diagram.version     # Of the diagram when it was indexed
+        for position, relation in enumerate(diagram.relations):
+            self.outgoing.setdefault(relation.source_key, []).append(relation)
+            self.incoming.setdefault(relation.target_key, []).append(relation)
+            self._outgoing_positions.setdefault(relation.source_key, []).append(position)
+
+    def successors(self, key: str) -> Iterable[str]:
+        return (relation.target_key for relation in self.outgoing.get(key, ()))
+
+    def predecessors(self, key: str) -> Iterable[str]:
+        return (relation.source_key for relation in self.incoming.get(key, ()))
+
+    def neighbours(self, key: str, direction: str = "both") -> Iterable[str]:
+        """Adjacent keys following edges "out", "in" or "both" ways."""
+        if direction in ("out", "both"):
+            yield from self.successors(key)
+        if direction in ("in", "both"):
+            yield from self.predecessors(key)
+
+    def degree(self, key: str) -> int:
+        return len(self.outgoing.get(key, ())) + len(self.incoming.get(key, ()))
+
+    def subgraph(self, keys: Set[str]) -> Diagram:
+        """The nodes with these keys and the relations between them, in diagram order.
+
+        Only looks at those nodes and their relations, not at the whole
+        diagram (apart from numbering its nodes the first time).
+        """
+        diagram = self.diagram
+        if self._node_positions is None:
+            self._node_positions = {key: position for position, key in enumerate(diagram.nodes)}
+        result = Diagram()
+        result.stylesheet = diagram.stylesheet
+        result.inline_stylesheet = diagram.inline_stylesheet
+        for key in sorted((key for key in keys if key in diagram.nodes), key=self._node_positions.__getitem__):
+            result.add_node(diagram.nodes[key])
+
+        relations = []
+        for key in keys:
+            for position, relation in zip(self._outgoing_positions.get(key, ()), self.outgoing.get(key, ())):
+                if relation.target_key in keys:
+                    relations.append((position, relation))
+        relations.sort(key=lambda item: item[0])
+        for _, relation in relations:
+            result.add_relation(relation)
+        return result
+
+
+_indexes: "weakref.WeakKeyDictionary[Diagram, GraphIndex]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def graph_index(diagram: Diagram) -> GraphIndex:
+    """The GraphIndex of diagram, built once and kept as long as the diagram is.
+
+    Renders that only change the options of the same parsed diagram (a
+    preview server moving the focus, for instance) reuse it. It is rebuilt
+    when Diagram.version shows the diagram changed since (an IncrementalParser
+    update, for instance); changes that bypass the Diagram methods are not seen.
+    """
+    with _indexes_lock:
+        index = _indexes.get(diagram)
+    if index is None or index.version != diagram.version:
+        index = GraphIndex(diagram)
+        with _indexes_lock:
+            _indexes[diagram] = index
+    return index
@@ -1,6 +1,10 @@
 from typing import List, Optional
 
 class Node:
+    __slots__ = ("name", "key", "variables", "functions", "color", "image", "shape", "css_class",
+                 "description", "cluster", "cluster_path", "cluster_class", "cluster_color",
+                 "cluster_style", "cluster_bgcolor")
+
     def __init__(self, name: str, key: str):
         self.name = name
         self.key = key
@@ -25,7 +29,7 @@ class Node:
     def add_function(self, function: str):
         self.functions.append(function)
 
-    def to_graphviz(self) -> str:
+    def to_graphviz(self, compact: bool = False) -> str:
         # If an image is present, the label is just the name, as the image will be the main content.
         if self.image:
             return self.name
@@ -35,6 +39,9 @@ class Node:
         if self.description:
             safe_desc = self.description.replace("<", "\\<").replace(">", "\\>")
             title = f"{title}\\n{safe_desc}"
+        # Compact labels (overviews) leave out the VAR and FUNC sections
+        if compact:
+            return "{ " + title + " }"
 
         var_section = "\\n".join(self.variables).replace("<", "\\<").replace(">", "\\>") if self.variables else "(None)"
         parts = [f"{title}", f"{{ Variables:\n|{var_section} }}"]
@@ -2,6 +2,9 @@ from typing import Optional
 
 
 class Relation:
+    __slots__ = ("source_key", "target_key", "label", "style", "color", "css_class",
+                 "arrowhead", "arrowtail", "dir")
+
     def __init__(self, source_key: str, target_key: str, label: str):
         self.source_key = source_key
         self.target_key = target_key
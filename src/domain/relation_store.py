@@ -0,0 +1,78 @@
+from array import array
+from typing import Dict, Iterator, List, Optional
+from src.domain.relation import Relation
+
+NONE = -1   # Column value for an unset (None) attribute
+
+
+class StoredRelation(Relation):
+    """A relation read from a RelationStore.
+
+    It is a copy of the stored edge, so it is read-only: setting an attribute
+    raises AttributeError instead of being silently lost. Build a new Relation
+    to change an edge.
+    """
+    __slots__ = ()
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError(f"relations read from a RelationStore are read-only (cannot set '{name}')")
+
+
+class RelationStore:
+    """Columnar, array-backed list of relations.
+
+    Each Relation field is a column of 32-bit indexes into one table of
+    distinct strings, so an edge costs a few bytes per field instead of a
+    Python object. Supports the list operations the rest of the code uses on
+    ``Diagram.relations``, except changing an edge in place: reading yields
+    read-only StoredRelation copies.
+    """
+
+    FIELDS = Relation.__slots__
+
+    def __init__(self):
+        self._strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._columns = {field: array("i") for field in self.FIELDS}
+
+    def _id(self, value: Optional[str]) -> int:
+        if value is None:
+            return NONE
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(value)
+            self._string_ids[value] = string_id
+        return string_id
+
+    def append(self, relation: Relation):
+        for field in self.FIELDS:
+            self._columns[field].append(self._id(getattr(relation, field)))
+
+    def extend(self, relations):
+        for relation in relations:
+            self.append(relation)
+
+    def clear(self):
+        self._strings = []
+        self._string_ids = {}
+        self._columns = {field: array("i") for field in self.FIELDS}
+
+    def __len__(self) -> int:
+        return len(self._columns["source_key"])
+
+    def __getitem__(self, index: int) -> Relation:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("relation index out of range")
+        strings = self._strings
+        values = [self._columns[field][index] for field in self.FIELDS]
+        relation = StoredRelation.__new__(StoredRelation)
+        for field, value in zip(self.FIELDS, values):
+            object.__setattr__(relation, field, None if value == NONE else strings[value])
+        return relation
+
+    def __iter__(self) -> Iterator[Relation]:
+        for index in range(len(self)):
+            yield self[index]
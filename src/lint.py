@@ -0,0 +1,124 @@
+from typing import Dict, List, Optional
+from src.domain.diagram import Diagram
+from src.domain.graph_index import GraphIndex
+from src.parser.markdown_parser import parse_markdown, split_blocks, merge_diagrams
+
+ERROR = "error"
+WARNING = "warning"
+
+# Cluster attributes taken from the first node of each cluster (see get_dot)
+CLUSTER_FIELDS = (("class", "cluster_class"), ("style", "cluster_style"),
+                  ("color", "cluster_color"), ("bgcolor", "cluster_bgcolor"))
+
+
+class LintIssue:
+    __slots__ = ("severity", "code", "message", "key", "line")
+
+    def __init__(self, severity: str, code: str, message: str, key: Optional[str] = None, line: Optional[int] = None):
+        self.severity = severity
+        self.code = code
+        self.message = message
+        self.key = key      # Node the issue belongs to, if any
+        self.line = line    # 1-based line of that node's header, if known
+
+    def format(self, path: str = "<diagram>") -> str:
+        location = f"{path}:{self.line}" if self.line else path
+        return f"{location}: {self.severity} [{self.code}] {self.message}"
+
+
+def check_diagram(diagram: Diagram, lines: Optional[Dict[str, int]] = None) -> List[LintIssue]:
+    """Finds mistakes that would otherwise only show up in the rendered image.
+
+    Runs in O(nodes + relations) and never calls Graphviz. lines optionally maps
+    node keys to their header line, to locate the issues.
+    """
+    lines = lines or {}
+    issues: List[LintIssue] = []
+    nodes = diagram.nodes
+    index = GraphIndex(diagram)
+
+    def add(severity, code, message, key=None):
+        issues.append(LintIssue(severity, code, message, key, lines.get(key)))
+
+    # Relations to keys without a node become phantom nodes in Graphviz
+    edge_counts: Dict[tuple, int] = {}
+    for relation in diagram.relations:
+        source, target = relation.source_key, relation.target_key
+        if source not in nodes or target not in nodes:
+            owner = source if source in nodes else target if target in nodes else None
+            missing = target if source in nodes else source
+            add(ERROR, "dangling-reference",
+                f"relation {source} -> {target} refers to missing key [{missing}]", owner)
+        edge = (source, target, relation.label)
+        edge_counts[edge] = edge_counts.get(edge, 0) + 1
+
+    # The same edge twice; a BI written on both nodes duplicates both directions
+    for (source, target, label), count in edge_counts.items():
+        if count < 2:
+            continue
+        reverse = edge_counts.get((target, source, label), 0)
+        label_text = f" {{{label}}}" if label else ""
+        if reverse >= 2 and source != target:
+            if source < target:
+                add(WARNING, "redundant-bi",
+                    f"BI relation between [{source}] and [{target}]{label_text} is declared more than once "
+                    f"(declare it on one node only)", source)
+        else:
+            add(WARNING, "duplicate-edge",
+                f"relation {source} -> {target}{label_text} appears {count} times", source)
+
+    # Only the first node of a cluster styles it; values on other nodes are ignored
+    cluster_owner = {}
+    for node in nodes.values():
+        if not node.cluster:
+            continue
+        path = tuple(node.cluster_path) + (node.cluster,)
+        first = cluster_owner.setdefault(path, node)
+        if first is node:
+            continue
+        for attr_name, field in CLUSTER_FIELDS:
+            value = getattr(node, field)
+            if value is not None and value != getattr(first, field):
+                add(WARNING, "cluster-metadata",
+                    f"cluster {'>'.join(path)}: {attr_name}={value} on [{node.key}] is ignored, "
+                    f"the cluster uses {attr_name}={getattr(first, field)} from [{first.key}]", node.key)
+
+    # Nodes no relation reaches or leaves
+    if diagram.relations:
+        for key in nodes:
+            if index.degree(key) == 0:
+                add(WARNING, "isolated", f"node [{key}] has no relations", key)
+
+    return issues
+
+
+def check_markdown(markdown_text: str) -> List[LintIssue]:
+    """check_diagram plus the issues only visible in the source, with line numbers.
+
+    Adds duplicate keys, which parse_markdown silently resolves by keeping
+    the last definition.
+    """
+    issues: List[LintIssue] = []
+    lines: Dict[str, int] = {}
+    parts = []
+    line_no = 1
+    for block in split_blocks(markdown_text):
+        part = parse_markdown(block)
+        for key in part.nodes:
+            if key in lines:
+                issues.append(LintIssue(ERROR, "duplicate-key",
+                                        f"key [{key}] is already defined at line {lines[key]}; this definition replaces it",
+                                        key, line_no))
+            else:
+                lines[key] = line_no
+        parts.append(part)
+        line_no += block.count("\n")
+
+    issues.extend(check_diagram(merge_diagrams(parts), lines))
+    issues.sort(key=lambda issue: issue.line or 0)
+    return issues
+
+
+def check_file(path: str) -> List[LintIssue]:
+    with open(path, "r", encoding="utf-8") as f:
+        return check_markdown(f.read())
@@ -0,0 +1,40 @@
+from typing import Dict
+from src.domain.diagram import Diagram
+from src.parser.markdown_parser import parse_markdown, split_blocks, merge_diagrams
+
+
+class IncrementalParser:
+    """Keeps a parsed Diagram in sync with a document that is edited over time.
+
+    The document is split into '# {Name} [key]' blocks and each block's parse
+    result is remembered by its text. On update only blocks whose text changed
+    are parsed again; the rest are reused, and ``diagram`` (always the same
+    object) has its nodes and relations patched in place.
+    """
+
+    def __init__(self):
+        self.diagram = Diagram()
+        self._fragments: Dict[str, Diagram] = {}   # block text -> parsed block
+        self.blocks_total = 0
+        self.blocks_reparsed = 0
+
+    def update(self, markdown_text: str) -> Diagram:
+        fragments: Dict[str, Diagram] = {}
+        parts = []
+        reparsed = 0
+        for block in split_blocks(markdown_text):
+            # Dict lookup hashes the block text; unchanged blocks hit the cache
+            fragment = fragments.get(block) or self._fragments.get(block)
+            if fragment is None:
+                fragment = parse_markdown(block)
+                reparsed += 1
+            fragments[block] = fragment
+            parts.append(fragment)
+
+        self._fragments = fragments
+        self.blocks_total = len(parts)
+        self.blocks_reparsed = reparsed
+
+        self.diagram.clear()
+        merge_diagrams(parts, self.diagram)
+        return self.diagram
@@ -1,164 +1,245 @@
 import re
+import sys
+from typing import Iterable, List, Optional
 from src.domain.node import Node
 from src.domain.diagram import Diagram
 from src.domain.relation import Relation
 
+# Line patterns, compiled once. Every line of the document is classified with at
+# most a couple of anchored matches, so parsing is linear in the input size.
+HEADER_RE = re.compile(r"^\s*#+\s*\{([^}]+)\}\s+\[(\w+)\]\s*$")
+ATTRIBUTE_RE = re.compile(r"(\w+)\s*=\s*([^,\]]+)")
+COLOR_RE = re.compile(r"COLOR\s+([A-Fa-f0-9]{6})")
+IMAGE_RE = re.compile(r"IMAGE\s+(https?://[^\s]+)")
+SHAPE_RE = re.compile(r"SHAPE\s+(\w+)")
+CLASS_RE = re.compile(r"CLASS\s+(\w+)")
+DESC_RE = re.compile(r"DESC\s+(.+)$")
+CLUSTER_RE = re.compile(r"CLUSTER\s+([^\[]+)")
+LABEL_RE = re.compile(r"\{(.*?)\}")
+TARGET_RE = re.compile(r"\[(\w+)\]")
+
+# Section markers: "## VAR" ... "## END VAR", etc.
+SECTIONS = ("VAR", "FUNC", "F_RELA")
+
+# Keys, labels and attribute values repeat across thousands of nodes and edges;
+# interning them keeps a single string object per distinct value.
+intern = sys.intern
+
 def parse_attributes(line: str) -> dict:
     """Parses attributes like [key=value, key2=value2]"""
     attrs = {}
     # Captura hasta coma o cierre de corchete
-    matches = re.findall(r"(\w+)\s*=\s*([^,\]]+)", line)
+    matches = ATTRIBUTE_RE.findall(line)
     for key, value in matches:
-        attrs[key] = value.strip()
+        attrs[key] = intern(value.strip())
     return attrs
 
-def parse_markdown(markdown_text: str) -> Diagram:
-    diagram = Diagram()
-
-    # Global stylesheet file
-    stylesheet_match = re.search(r"^### STYLESHEET\s+(.+)$", markdown_text, re.MULTILINE)
-    if stylesheet_match:
-        diagram.stylesheet = stylesheet_match.group(1).strip()
-
-    # Inline stylesheet block
-    inline_stylesheet_match = re.search(r"### STYLESHEET\n(.*?)\n### END STYLESHEET", markdown_text, re.DOTALL)
-    if inline_stylesheet_match:
-        diagram.inline_stylesheet = inline_stylesheet_match.group(1).strip()
-
-    # Node blocks with optional sections (VAR, FUNC, F_RELA). Name accepts any chars until '}'.
-    blocks = re.findall(
-        r"#\s*{([^}]+)}\s+\[(\w+)\]\s*\n"
-        r"((?:### OPT .*?\n)*)?"                  # optional options lines
-        r"(?:## VAR(.*?)## END VAR\s*)?"          # optional VAR block
-        r"(?:## FUNC(.*?)## END FUNC\s*)?"        # optional FUNC block
-        r"(?:## F_RELA(.*?)## END F_RELA\s*)?",   # optional relations block
-        markdown_text,
-        re.DOTALL,
-    )
-
-    for block in blocks:
-        name, key, opts_block, var_block, func_block, rela_block_full = block
-        node = Node(name, key)
-
-        if opts_block:
-            opts = opts_block.strip().split('\n')
-            for opt in opts:
-                if 'COLOR' in opt:
-                    color_match = re.search(r"COLOR\s+([A-Fa-f0-9]{6})", opt)
-                    if color_match:
-                        node.color = f"#{color_match.group(1)}"
-                elif 'IMAGE' in opt:
-                    image_match = re.search(r"IMAGE\s+(https?://[^\s]+)", opt)
-                    if image_match:
-                        node.image = image_match.group(1)
-                elif 'SHAPE' in opt:
-                    shape_match = re.search(r"SHAPE\s+(\w+)", opt)
-                    if shape_match:
-                        node.shape = shape_match.group(1)
-                elif 'CLASS' in opt:
-                    class_match = re.search(r"CLASS\s+(\w+)", opt)
-                    if class_match:
-                        node.css_class = class_match.group(1)
-                elif 'DESC' in opt:
-                    # Everything after DESC is considered the description (trim quotes if provided)
-                    desc_match = re.search(r"DESC\s+(.+)$", opt)
-                    if desc_match:
-                        desc = desc_match.group(1).strip()
-                        if (desc.startswith('"') and desc.endswith('"')) or (desc.startswith("'") and desc.endswith("'")):
-                            desc = desc[1:-1]
-                        node.description = desc
-                elif 'CLUSTER' in opt:
-                    # Syntax: CLUSTER <name> or CLUSTER <A>B>C> [attributes...]
-                    cluster_name_match = re.search(r"CLUSTER\s+([^\[]+)", opt)
-                    if cluster_name_match:
-                        full_cluster_name = cluster_name_match.group(1).strip()
-                        parts = [p.strip() for p in full_cluster_name.split('>')]
-                        if len(parts) > 1:
-                            node.cluster_path = parts[:-1]
-                            node.cluster = parts[-1]
-                        else:
-                            node.cluster = parts[0]
-
-                    # parse inline [k=v,...]
-                    cluster_attrs = parse_attributes(opt)
-                    if 'class' in cluster_attrs:
-                        node.cluster_class = cluster_attrs.get('class')
-                    if 'style' in cluster_attrs:
-                        node.cluster_style = cluster_attrs.get('style')
-                    if 'color' in cluster_attrs:
-                        node.cluster_color = cluster_attrs.get('color')
-                    if 'bgcolor' in cluster_attrs:
-                        node.cluster_bgcolor = cluster_attrs.get('bgcolor')
-
-        if var_block:
-            for var in var_block.strip().split("\n"):
-                if var.strip():
-                    node.add_variable(var.strip("- ").strip())
-
-        if func_block:
-            for func in func_block.strip().split("\n"):
-                if func.strip():
-                    node.add_function(func.strip("- ").strip())
-
-        diagram.add_node(node)
-
-        rela_block_content = None
-        if rela_block_full:
-            # In the new pattern we already capture only the inner content
-            rela_block_content = rela_block_full
-
-        if rela_block_content:
-            relations_block = rela_block_content
-            for line in relations_block.strip().split("\n"):
-                if not line.strip():
-                    continue
-
-                label_match = re.search(r"\{(.*?)\}", line)
-                label = label_match.group(1) if label_match else ""
-
-                target_key_match = re.search(r"\[(\w+)\]", line)
-                if not target_key_match:
-                    continue
-
-                target_key = target_key_match.group(1)
-                attrs = parse_attributes(line)
-
-                relation = None
-                if line.strip().startswith("- TO"):
-                    relation = Relation(key, target_key, label)
-                elif line.strip().startswith("- FROM"):
-                    relation = Relation(target_key, key, label)
-                elif line.strip().startswith("- BI"):
-                    relation1 = Relation(key, target_key, label)
-                    relation2 = Relation(target_key, key, label)
-                    relation1.style = attrs.get('style')
-                    relation1.color = attrs.get('color')
-                    relation1.css_class = attrs.get('class')
-                    relation2.style = attrs.get('style')
-                    relation2.color = attrs.get('color')
-                    relation2.css_class = attrs.get('class')
-                    diagram.add_relation(relation1)
-                    diagram.add_relation(relation2)
-                    continue
-                if relation:
-                    relation.style = attrs.get('style')
-                    relation.color = attrs.get('color')
-                    relation.css_class = attrs.get('class')
+def apply_option(node: Node, opt: str):
+    """Applies a single '### OPT <KIND> ...' line to the node."""
+    parts = opt.split(None, 3)
+    kind = parts[2] if len(parts) > 2 else ""
+
+    if kind == 'COLOR':
+        color_match = COLOR_RE.search(opt)
+        if color_match:
+            node.color = intern(f"#{color_match.group(1)}")
+    elif kind == 'IMAGE':
+        image_match = IMAGE_RE.search(opt)
+        if image_match:
+            node.image = image_match.group(1)
+    elif kind == 'SHAPE':
+        shape_match = SHAPE_RE.search(opt)
+        if shape_match:
+            node.shape = intern(shape_match.group(1))
+    elif kind == 'CLASS':
+        class_match = CLASS_RE.search(opt)
+        if class_match:
+            node.css_class = intern(class_match.group(1))
+    elif kind == 'DESC':
+        # Everything after DESC is considered the description (trim quotes if provided)
+        desc_match = DESC_RE.search(opt)
+        if desc_match:
+            desc = desc_match.group(1).strip()
+            if (desc.startswith('"') and desc.endswith('"')) or (desc.startswith("'") and desc.endswith("'")):
+                desc = desc[1:-1]
+            node.description = desc
+    elif kind == 'CLUSTER':
+        # Syntax: CLUSTER <name> or CLUSTER <A>B>C> [attributes...]
+        cluster_name_match = CLUSTER_RE.search(opt)
+        if cluster_name_match:
+            full_cluster_name = cluster_name_match.group(1).strip()
+            parts = [intern(p.strip()) for p in full_cluster_name.split('>')]
+            if len(parts) > 1:
+                node.cluster_path = parts[:-1]
+                node.cluster = parts[-1]
+            else:
+                node.cluster = parts[0]
+
+        # parse inline [k=v,...]
+        cluster_attrs = parse_attributes(opt)
+        if 'class' in cluster_attrs:
+            node.cluster_class = cluster_attrs.get('class')
+        if 'style' in cluster_attrs:
+            node.cluster_style = cluster_attrs.get('style')
+        if 'color' in cluster_attrs:
+            node.cluster_color = cluster_attrs.get('color')
+        if 'bgcolor' in cluster_attrs:
+            node.cluster_bgcolor = cluster_attrs.get('bgcolor')
+
+def parse_relation(key: str, line: str) -> List[Relation]:
+    """Parses one '- TO|FROM|BI [target] {label} [attrs]' line of a F_RELA block."""
+    line = line.strip()
+    if not line:
+        return []
+
+    label_match = LABEL_RE.search(line)
+    label = intern(label_match.group(1)) if label_match else ""
+
+    target_key_match = TARGET_RE.search(line)
+    if not target_key_match:
+        return []
+
+    target_key = intern(target_key_match.group(1))
+    attrs = parse_attributes(line)
+
+    if line.startswith("- TO"):
+        relation = Relation(key, target_key, label)
+        relation.arrowhead = attrs.get('arrowhead')
+        relation.arrowtail = attrs.get('arrowtail')
+        relations = [relation]
+    elif line.startswith("- FROM"):
+        # Ends are swapped: the arrow is drawn from the target back to this node
+        relation = Relation(target_key, key, label)
+        relation.arrowtail = attrs.get('arrowhead')
+        relation.arrowhead = attrs.get('arrowtail')
+        relations = [relation]
+    elif line.startswith("- BI"):
+        relations = [Relation(key, target_key, label), Relation(target_key, key, label)]
+    else:
+        return []
+
+    for relation in relations:
+        relation.style = attrs.get('style')
+        relation.color = attrs.get('color')
+        relation.css_class = attrs.get('class')
+    return relations
+
+def parse_markdown(markdown_text: str, compact_relations: bool = False) -> Diagram:
+    """Parses a Grarkdown document in a single pass over its lines.
+
+    The parser is a small state machine: a '# {Name} [key]' header opens a node
+    block, '### OPT' lines configure it, and '## VAR' / '## FUNC' / '## F_RELA'
+    open sections that run until their matching '## END ...' line. Blank lines
+    may separate the parts of a block; any other text closes it. A new header
+    always starts a new block, discarding any section left unterminated.
+
+    With compact_relations the edges go to a columnar RelationStore, which
+    needs far less memory on models with hundreds of thousands of edges.
+    """
+    diagram = Diagram(compact_relations)
+
+    node: Optional[Node] = None
+    section: Optional[str] = None       # Open section of the current node
+    in_stylesheet = False               # Inside an inline STYLESHEET block
+    stylesheet_lines: List[str] = []
+
+    for raw_line in markdown_text.splitlines():
+        line = raw_line.strip()
+
+        if in_stylesheet:
+            if line == "### END STYLESHEET":
+                in_stylesheet = False
+                if diagram.inline_stylesheet is None:
+                    diagram.inline_stylesheet = "\n".join(stylesheet_lines).strip()
+            elif diagram.inline_stylesheet is None:
+                stylesheet_lines.append(raw_line)
+            continue
+
+        header_match = HEADER_RE.match(line) if line.startswith("#") else None
+        if header_match:
+            name, key = header_match.groups()
+            node = Node(name, intern(key))
+            section = None
+            diagram.add_node(node)
+            continue
+
+        if section is not None:
+            if line == f"## END {section}":
+                section = None
+            elif section == "F_RELA":
+                for relation in parse_relation(node.key, line):
                     diagram.add_relation(relation)
-                    
-                    if(attrs.get('arrowhead')):
-                        if line.strip().startswith("- TO"):
-                            relation.arrowhead = attrs.get('arrowhead')
-                        elif line.strip().startswith("- FROM"):
-                            relation.arrowtail = attrs.get('arrowhead')
-                    if(attrs.get('arrowtail')):
-                        if line.strip().startswith("- TO"):
-                            relation.arrowtail = attrs.get('arrowtail')
-                        elif line.strip().startswith("- FROM"):
-                            relation.arrowhead = attrs.get('arrowtail')
-                        
-                        
-    return diagram
-
+            elif line:
+                item = line.strip("- ").strip()
+                if section == "VAR":
+                    node.add_variable(item)
+                else:
+                    node.add_function(item)
+            continue
+
+        if line.startswith("### STYLESHEET"):
+            value = line[len("### STYLESHEET"):].strip()
+            if not value:
+                in_stylesheet = True
+            elif diagram.stylesheet is None:
+                diagram.stylesheet = value
+            continue
+
+        if node is None or not line:
+            continue
+
+        if line.startswith("### OPT "):
+            apply_option(node, line)
+        elif line.startswith("## ") and line[3:] in SECTIONS:
+            section = line[3:]
+        else:
+            # Any other text (prose, code fences...) closes the current block
+            node = None
 
+    return diagram
 
+def split_blocks(markdown_text: str) -> List[str]:
+    """Splits a document into independent pieces at '# {Name} [key]' headers.
+
+    The first piece holds whatever precedes the first header. Headers inside an
+    inline STYLESHEET block are not split points, so parsing every piece on its
+    own and joining the results with merge_diagrams gives the same Diagram as
+    parse_markdown on the whole text.
+    """
+    blocks = []
+    current: List[str] = []
+    in_stylesheet = False
+
+    for raw_line in markdown_text.splitlines(keepends=True):
+        line = raw_line.strip()
+        if in_stylesheet:
+            in_stylesheet = line != "### END STYLESHEET"
+        elif line == "### STYLESHEET":
+            in_stylesheet = True
+        elif current and line.startswith("#") and HEADER_RE.match(line):
+            blocks.append("".join(current))
+            current = []
+        current.append(raw_line)
+
+    if current:
+        blocks.append("".join(current))
+    return blocks
+
+def merge_diagrams(parts: Iterable[Diagram], diagram: Optional[Diagram] = None) -> Diagram:
+    """Joins partial diagrams in document order (into diagram, if given).
+
+    Later nodes replace earlier ones with the same key, and the first stylesheet
+    found wins, exactly as when parsing the whole document at once.
+    """
+    if diagram is None:
+        diagram = Diagram()
+    for part in parts:
+        for node in part.nodes.values():
+            diagram.add_node(node)
+        for relation in part.relations:
+            diagram.add_relation(relation)
+        if diagram.stylesheet is None:
+            diagram.stylesheet = part.stylesheet
+        if diagram.inline_stylesheet is None:
+            diagram.inline_stylesheet = part.inline_stylesheet
+    return diagram
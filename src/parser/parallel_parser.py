@@ -0,0 +1,97 @@
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from src.domain.diagram import Diagram
+from src.parser.markdown_parser import HEADER_RE, merge_diagrams, parse_markdown
+
+MIN_CHUNK_SIZE = 1024 * 1024    # Smaller files and chunks are not worth a process
+CHUNKS_PER_WORKER = 4           # More chunks than workers evens out uneven blocks
+
+# Byte-level candidates; each one is confirmed with HEADER_RE on the decoded line
+HEADER_LINE_RE = re.compile(rb"^[ \t]*#+[ \t]*\{[^}\n]+\}[ \t]+\[\w+\][ \t]*\r?$", re.MULTILINE)
+STYLESHEET_RE = re.compile(rb"^[ \t]*### STYLESHEET[ \t\r]*$", re.MULTILINE)
+END_STYLESHEET_RE = re.compile(rb"^[ \t]*### END STYLESHEET[ \t\r]*$", re.MULTILINE)
+
+
+def _stylesheet_blocks(data) -> List[Tuple[int, int]]:
+    """Byte ranges of the inline STYLESHEET blocks, which must not be split."""
+    blocks = []
+    position = 0
+    while True:
+        start = STYLESHEET_RE.search(data, position)
+        if start is None:
+            return blocks
+        end = END_STYLESHEET_RE.search(data, start.end())
+        if end is None:  # Unterminated: runs to the end of the document
+            blocks.append((start.start(), len(data)))
+            return blocks
+        blocks.append((start.start(), end.end()))
+        position = end.end()
+
+
+def _is_header(line: bytes) -> bool:
+    text = line.decode("utf-8", "replace")
+    # Also a single line for str.splitlines, which breaks at more characters than \n
+    return len(text.splitlines()) == 1 and HEADER_RE.match(text.strip()) is not None
+
+
+def chunk_offsets(data, chunk_size: int) -> List[int]:
+    """Start offsets of chunks of about chunk_size bytes, each beginning at a node header.
+
+    data is the whole document as bytes or an mmap. Split points skip headers
+    inside inline STYLESHEET blocks, so each chunk parses on its own exactly
+    like the blocks of split_blocks.
+    """
+    stylesheets = _stylesheet_blocks(data)
+    offsets = [0]
+    target = chunk_size
+    while target < len(data):
+        match = HEADER_LINE_RE.search(data, target)
+        while match is not None:
+            start = match.start()
+            inside = next((end for begin, end in stylesheets if begin < start < end), None)
+            if inside is not None:
+                match = HEADER_LINE_RE.search(data, inside)
+            elif match.start() > offsets[-1] and _is_header(match.group(0)):
+                break
+            else:
+                match = HEADER_LINE_RE.search(data, match.end())
+        if match is None:
+            break
+        offsets.append(match.start())
+        target = match.start() + chunk_size
+    return offsets
+
+
+def _parse_chunk(path: str, start: int, end: int, compact_relations: bool) -> Diagram:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return parse_markdown(data[start:end].decode("utf-8"), compact_relations)
+
+
+def parse_file_parallel(path: str, workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                        compact_relations: bool = False) -> Diagram:
+    """Parses a large document on several processes.
+
+    The file is memory-mapped and cut at node headers into chunks that worker
+    processes parse independently (each maps the file itself, so only the
+    parsed nodes and relations travel back). The parts are merged in file
+    order, so the Diagram is the same as parse_markdown on the whole text.
+    Files too small to be worth it are parsed in this process.
+    """
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(path)
+    if size == 0:
+        return Diagram(compact_relations)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        offsets = [0]
+        if workers > 1 and size >= 2 * MIN_CHUNK_SIZE:
+            offsets = chunk_offsets(data, chunk_size or max(MIN_CHUNK_SIZE, size // (workers * CHUNKS_PER_WORKER)))
+        if len(offsets) == 1:
+            return parse_markdown(data[:].decode("utf-8"), compact_relations)
+
+    ends = offsets[1:] + [size]
+    with ProcessPoolExecutor(max_workers=min(workers, len(offsets))) as pool:
+        parts = pool.map(_parse_chunk, [path] * len(offsets), offsets, ends, [compact_relations] * len(offsets))
+        return merge_diagrams(parts, Diagram(compact_relations))
@@ -0,0 +1,151 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Tuple
+from src.parser.markdown_parser import parse_markdown
+from src.parser.incremental_parser import IncrementalParser
+from src.parser.parallel_parser import parse_file_parallel
+from src.profiling import get_profile, record_diagram
+from src.renderer.dot_writer import DotSource
+from src.renderer.graphviz_renderer import render_formats
+from src.renderer.image_cache import ImageCache
+
+
+FORMATS = ("svg", "png", "pdf", "dot")
+
+
+def parse_formats(fmt: str) -> List[str]:
+    """The formats of a comma-separated list like "svg,png,pdf", in order and without repeats."""
+    formats = list(dict.fromkeys(f.strip().lower() for f in fmt.split(",") if f.strip()))
+    unknown = [f for f in formats if f not in FORMATS]
+    if not formats or unknown:
+        raise ValueError(f"unsupported format(s) {', '.join(unknown) or repr(fmt)}; choose from {', '.join(FORMATS)}")
+    return formats
+
+
+def write_outputs(diagram, output_file: str, formats: List[str], options=None, dot=None) -> List[str]:
+    """Writes the DOT source and/or the Graphviz renders of diagram, laying it out once."""
+    paths = {}
+    if "dot" in formats:
+        diagram_path = f"{output_file}.dot"
+        dot = dot or DotSource(diagram, options)  # prefetches images before the file is created
+        with open(diagram_path, "w", encoding="utf-8") as dot_file:
+            dot.write(dot_file)  # exporta el DOT directamente, línea a línea
+            get_profile(options).count("dot_bytes", dot_file.tell())
+        paths["dot"] = diagram_path
+    rendered = [f for f in formats if f != "dot"]
+    if rendered:
+        if options and options.get("split_components"):
+            dot = None  # Each component gets its own DOT and layout (see layout_components)
+        paths.update(zip(rendered, render_formats(diagram, output_file, rendered, options, dot)))
+    return [paths[f] for f in formats]
+
+
+def render_file(path: str, output_file: str, fmt: str = "svg", options=None) -> List[str]:
+    """Parses one Grarkdown file and writes the diagram in each format of fmt
+    (e.g. "svg" or "svg,png,pdf"). Returns the output paths."""
+    profile = get_profile(options)
+    parse_workers = (options or {}).get("parse_workers")
+    if parse_workers is not None:
+        # Memory-mapped and parsed in chunks on several processes (0: one per CPU)
+        with profile.phase("parse"):
+            diagram = parse_file_parallel(path, parse_workers or None)
+    else:
+        with profile.phase("read"):
+            with open(path, "r", encoding="utf-8") as f:
+                markdown_text = f.read()
+        with profile.phase("parse"):
+            diagram = parse_markdown(markdown_text)
+    record_diagram(profile, diagram)
+    return write_outputs(diagram, output_file, parse_formats(fmt), options)
+
+
+def discover_documents(directory: str) -> List[str]:
+    """All .md files under directory, sorted so batch runs are reproducible."""
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if name.endswith(".md"):
+                found.append(os.path.join(root, name))
+    return found
+
+
+# --- Batch workers ---
+# Each worker process builds its own ImageCache (sessions and locks cannot be
+# pickled); they all point at the same cache directory.
+_worker_options: dict = {}
+
+def _init_worker(options: dict, cache_settings: dict):
+    global _worker_options
+    _worker_options = dict(options, image_cache=ImageCache(**cache_settings))
+
+def _render_job(path: str, output_file: str, fmt: str) -> Tuple[str, Optional[List[str]], Optional[str]]:
+    try:
+        return path, render_file(path, output_file, fmt, _worker_options), None
+    except Exception as e:  # one broken document must not abort the whole batch
+        return path, None, f"{type(e).__name__}: {e}"
+
+
+def render_batch(directory: str, output_dir: Optional[str] = None, fmt: str = "svg", options=None,
+                 cache_settings=None, jobs: Optional[int] = None) -> Iterator[Tuple[str, Optional[List[str]], Optional[str]]]:
+    """Renders every document under directory on a pool of worker processes.
+
+    Outputs go next to each source file, or mirror the tree under output_dir.
+    Yields (source, output_paths, error) as each file finishes; exactly one of
+    output_paths and error is set.
+    """
+    options = {k: v for k, v in (options or {}).items() if k != "image_cache"}
+    documents = discover_documents(directory)
+    if not documents:
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(options, cache_settings or {})) as pool:
+        futures = []
+        for path in documents:
+            stem = os.path.splitext(path)[0]
+            if output_dir:
+                stem = os.path.join(output_dir, os.path.relpath(stem, directory))
+                os.makedirs(os.path.dirname(stem), exist_ok=True)
+            futures.append(pool.submit(_render_job, path, os.path.abspath(stem), fmt))
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def watch_file(path: str, output_file: str, fmt: str = "svg", options=None, interval: float = 0.3):
+    """Re-renders path every time it changes, until interrupted.
+
+    The parsed Diagram stays in memory and only edited blocks are parsed again.
+    The output is rewritten only when the generated DOT actually differs
+    (with split_components, the whole-diagram DOT is only compared, not laid out).
+    """
+    formats = parse_formats(fmt)
+    parser = IncrementalParser()
+    last_mtime = None
+    last_source = None
+
+    while True:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime != last_mtime:
+            last_mtime = mtime
+            start = time.perf_counter()
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    diagram = parser.update(f.read())
+                dot = DotSource(diagram, options)
+                source = dot.source
+                if source == last_source:
+                    print(f"Re-parsed {parser.blocks_reparsed}/{parser.blocks_total} blocks, diagram unchanged")
+                else:
+                    diagram_paths = write_outputs(diagram, output_file, formats, options, dot)
+                    last_source = source
+                    elapsed = time.perf_counter() - start
+                    print(f"Re-parsed {parser.blocks_reparsed}/{parser.blocks_total} blocks, "
+                          f"diagram generated at: {', '.join(diagram_paths)} ({elapsed:.2f}s)")
+            except Exception as e:  # keep watching: the next save may fix it
+                print(f"Error: {type(e).__name__}: {e}")
+        time.sleep(interval)
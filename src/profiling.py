@@ -0,0 +1,137 @@
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List
+
+# A hook receives every measurement as it is recorded: hook("parse_seconds", 0.12),
+# hook("nodes", 240)... Timings end in "_seconds"; everything else is a count.
+# Values are increments: a phase that runs several times (get_dot per component)
+# or a count added in several places reaches the hook once each time.
+Hook = Callable[[str, float], None]
+
+HOOKS: List[Hook] = []
+
+
+def add_hook(hook: Hook):
+    """Registers a hook for every Profile created from now on (e.g. a metrics exporter)."""
+    HOOKS.append(hook)
+
+
+def remove_hook(hook: Hook):
+    HOOKS.remove(hook)
+
+
+class Profile:
+    """Timings and counters of one render.
+
+    Phases that run several times (get_dot per component, for instance) add
+    up. Safe to share between threads. Put it in the render options as
+    ``options["profile"]`` to enable the instrumentation.
+    """
+
+    def __init__(self, hooks: Iterable[Hook] = ()):
+        self.timings: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.hooks = HOOKS + list(hooks)
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float):
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+        self._emit(f"{name}_seconds", seconds)
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+        self._emit(name, value)
+
+    def timed_chunks(self, name: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Passes chunks through, adding the time spent producing them to phase name.
+
+        The time is recorded once, when the chunks run out (or the stream is
+        abandoned), not once per chunk.
+        """
+        iterator = iter(chunks)
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                chunk = next(iterator, None)
+                elapsed += time.perf_counter() - start
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.add_time(name, elapsed)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "total_seconds": round(time.perf_counter() - self._start, 6),
+                "phases": {name: round(seconds, 6) for name, seconds in self.timings.items()},
+                "counts": dict(self.counts),
+            }
+
+    def _emit(self, metric: str, value: float):
+        for hook in self.hooks:
+            try:
+                hook(metric, value)
+            except Exception as e:  # a broken exporter must not break the render
+                print(f"Warning: profile hook {hook!r} failed: {e}", file=sys.stderr)
+
+
+class _NullProfile(Profile):
+    """Stand-in used when profiling is off: records nothing."""
+
+    def __init__(self):
+        super().__init__()
+        self.hooks = []
+
+    @contextmanager
+    def phase(self, name: str):
+        yield
+
+    def add_time(self, name: str, seconds: float):
+        pass
+
+    def count(self, name: str, value: int = 1):
+        pass
+
+    def timed_chunks(self, name: str, chunks: Iterable[bytes]) -> Iterable[bytes]:
+        return chunks
+
+
+NULL_PROFILE = _NullProfile()
+
+
+def get_profile(options=None) -> Profile:
+    """The Profile in the render options, or one that records nothing."""
+    return (options or {}).get("profile") or NULL_PROFILE
+
+
+def record_diagram(profile: Profile, diagram):
+    """Counts the nodes, relations, clusters and distinct images of a parsed diagram."""
+    clusters = set()
+    images = set()
+    for node in diagram.nodes.values():
+        if node.cluster:
+            path = tuple(node.cluster_path or ()) + (node.cluster,)
+            # Every level of a nested cluster is a cluster of its own
+            for depth in range(1, len(path) + 1):
+                clusters.add(path[:depth])
+        if node.image:
+            images.add(node.image.split("?")[0])
+    profile.count("nodes", len(diagram.nodes))
+    profile.count("relations", len(diagram.relations))
+    profile.count("clusters", len(clusters))
+    profile.count("images", len(images))
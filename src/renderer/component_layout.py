@@ -0,0 +1,158 @@
+import contextlib
+import math
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import ContextManager, Dict, Iterator, List, Optional
+from src.domain.diagram import Diagram
+from src.profiling import get_profile
+from src.renderer.dot_writer import DotSource
+from src.renderer.graphviz_renderer import DEFAULT_IMAGE_WORKERS, prefetch_images
+from src.renderer.level_of_detail import apply_level_of_detail, without_level_of_detail
+from src.renderer.render_cache import pipe_cached
+
+PACK_MARGIN = 16.0  # Points between packed components
+
+ROOT_SVG_RE = re.compile(r"<svg\b[^>]*>")
+SVG_ATTR_RE = re.compile(r'([\w:-]+)="([^"]*)"')
+ID_REF_RE = re.compile(r'(\bid="|url\(#|href="#)')
+
+
+def split_components(diagram: Diagram) -> List[Diagram]:
+    """Splits a diagram into parts that share no relation and no top-level cluster.
+
+    Uses union-find over keys, so it runs in O(nodes + relations). Parts come in
+    the order of their first node; nodes and relations keep their original order.
+    """
+    parent: Dict[str, str] = {}
+
+    def find(key: str) -> str:
+        root = parent.setdefault(key, key)
+        while root != parent[root]:
+            root = parent[root]
+        while key != root:  # Path compression
+            parent[key], key = root, parent[key]
+        return root
+
+    def union(a: str, b: str):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+
+    # A top-level cluster is drawn as one box, so all its nodes stay together
+    cluster_members: Dict[str, str] = {}
+    for node in diagram.nodes.values():
+        find(node.key)
+        if node.cluster:
+            top = node.cluster_path[0] if node.cluster_path else node.cluster
+            union(cluster_members.setdefault(top, node.key), node.key)
+    for relation in diagram.relations:
+        union(relation.source_key, relation.target_key)
+
+    parts: Dict[str, Diagram] = {}
+    for node in diagram.nodes.values():
+        root = find(node.key)
+        part = parts.get(root)
+        if part is None:
+            part = parts[root] = Diagram()
+            part.stylesheet = diagram.stylesheet
+            part.inline_stylesheet = diagram.inline_stylesheet
+        part.add_node(node)
+    for relation in diagram.relations:
+        root = find(relation.source_key)
+        if root not in parts:
+            # Relation between keys with no node at all: Graphviz still draws it
+            parts[root] = Diagram()
+        parts[root].add_relation(relation)
+    return list(parts.values())
+
+
+class _LaidOut:
+    """One component's Graphviz SVG, split into prolog, size and body."""
+
+    def __init__(self, svg: str, prefix: str):
+        root = ROOT_SVG_RE.search(svg)
+        self.prolog = svg[:root.start()]
+        self.root_attrs = dict(SVG_ATTR_RE.findall(root.group(0)))
+        body = svg[root.end():svg.rindex("</svg>")]
+        # Graphviz numbers ids (graph0, node1, clust1...) from scratch in every run
+        self.body = ID_REF_RE.sub(lambda m: m.group(1) + prefix, body)
+        view_box = self.root_attrs.get("viewBox")
+        if view_box:
+            self.view_box = view_box
+            _, _, self.width, self.height = (float(v) for v in view_box.replace(",", " ").split())
+        else:
+            self.width = float(self.root_attrs.get("width", "0").rstrip("ptx"))
+            self.height = float(self.root_attrs.get("height", "0").rstrip("ptx"))
+            self.view_box = f"0 0 {self.width} {self.height}"
+
+
+def pack_svgs(svgs: List[str]) -> Iterator[bytes]:
+    """Tiles several Graphviz SVGs into one document with shelf packing.
+
+    Components are placed left to right in rows about as wide as the square
+    root of their total area (never narrower than the widest one), each in a
+    nested <svg> positioned in points.
+    """
+    parts = [_LaidOut(svg, f"p{i}_") for i, svg in enumerate(svgs)]
+    total_area = sum((p.width + PACK_MARGIN) * (p.height + PACK_MARGIN) for p in parts)
+    row_width = max(max(p.width for p in parts), math.sqrt(total_area))
+
+    placements = []
+    x = y = row_height = 0.0
+    for part in parts:
+        if x > 0 and x + part.width > row_width:
+            x, y = 0.0, y + row_height + PACK_MARGIN
+            row_height = 0.0
+        placements.append((x, y))
+        x += part.width + PACK_MARGIN
+        row_height = max(row_height, part.height)
+    width = max(px + p.width for (px, _), p in zip(placements, parts))
+    height = y + row_height
+
+    first = parts[0]
+    namespaces = "".join(f' {name}="{value}"' for name, value in first.root_attrs.items()
+                         if name.startswith("xmlns"))
+    yield first.prolog.encode("utf-8")
+    yield (f'<svg width="{width:.2f}pt" height="{height:.2f}pt" viewBox="0.00 0.00 {width:.2f} {height:.2f}"'
+           f'{namespaces}>\n').encode("utf-8")
+    for (px, py), part in zip(placements, parts):
+        yield (f'<svg x="{px:.2f}" y="{py:.2f}" width="{part.width:.2f}" height="{part.height:.2f}" '
+               f'viewBox="{part.view_box}">').encode("utf-8")
+        yield part.body.encode("utf-8")
+        yield b"</svg>\n"
+    yield b"</svg>\n"
+
+
+def layout_components(diagram: Diagram, options=None, image_paths=None,
+                      max_workers: Optional[int] = None,
+                      graphviz_slot: Optional[ContextManager] = None) -> Iterator[bytes]:
+    """Lays out each independent component in its own Graphviz process, in parallel.
+
+    Yields the packed SVG in chunks, ready for the usual post-processing.
+    Each component's layout runs inside graphviz_slot, if given (the render
+    server passes its GraphvizSlots, so its process limit holds here too).
+    """
+    options = options or {}
+    # Collapse first: summary nodes can join otherwise separate components
+    diagram = apply_level_of_detail(diagram, options)
+    component_options = without_level_of_detail(options)
+    if image_paths is None:
+        image_paths = prefetch_images(diagram, options.get("image_cache"), options.get("image_workers", DEFAULT_IMAGE_WORKERS),
+                                      get_profile(options), options.get("image_dpi"))
+    components = split_components(diagram)
+    get_profile(options).count("components", len(components))
+    cache = options.get("render_cache")
+    slot = graphviz_slot or contextlib.nullcontext()
+
+    def layout(component: Diagram) -> str:
+        dot = DotSource(component, component_options, image_paths)
+        with slot:
+            return b"".join(pipe_cached(dot, "svg", options, cache)).decode("utf-8")
+
+    if len(components) <= 1:
+        yield layout(diagram).encode("utf-8")
+        return
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        svgs = list(pool.map(layout, components))
+    yield from pack_svgs(svgs)
@@ -0,0 +1,137 @@
+import re
+import time
+from typing import Dict, Iterator, Optional, TextIO
+
+from src.domain.diagram import Diagram
+from src.profiling import get_profile
+from src.renderer.graphviz_renderer import (DEFAULT_IMAGE_WORKERS, build_cluster_hierarchy, choose_engine,
+                                            cluster_statements, edge_attributes, graph_statements,
+                                            node_attributes, prefetch_images)
+from src.renderer.layout_positions import seed_positions
+from src.renderer.level_of_detail import apply_level_of_detail
+
+# The quoting rules of graphviz.quoting (graphviz package 0.21), copied here
+# since that module is internal to the package
+ID = re.compile(r"([a-zA-Z_][a-zA-Z0-9_]*|-?(\.[0-9]+|[0-9]+(\.[0-9]*)?))$")
+KEYWORDS = {"node", "edge", "graph", "digraph", "subgraph", "strict"}
+HTML_STRING = re.compile(r"<.*>$", re.DOTALL)
+UNESCAPED_QUOTE = re.compile(r"(?P<escaped_backslashes>(?:\\{2})*)\\?(?P<literal_quote>\")")
+
+
+def quote(identifier: str) -> str:
+    """A DOT ID for identifier, quoted only when needed (same rules as graphviz.quoting.quote)."""
+    if HTML_STRING.match(identifier):
+        return identifier
+    if not ID.match(identifier) or identifier.lower() in KEYWORDS:
+        # \" counts as " and is escaped once, like graphviz does
+        return '"' + UNESCAPED_QUOTE.sub(r"\g<escaped_backslashes>\\\g<literal_quote>", identifier) + '"'
+    return identifier
+
+
+def quote_edge(identifier: str) -> str:
+    """An edge endpoint, keeping a node:port:compass suffix unquoted."""
+    node, _, rest = identifier.partition(":")
+    if not rest:
+        return quote(node)
+    port, _, compass = rest.partition(":")
+    return ":".join([quote(node), quote(port)] + ([compass] if compass else []))
+
+
+def a_list(label: Optional[str], attrs: dict) -> str:
+    """label first, then the other attributes sorted by name, as the graphviz package writes them."""
+    result = [f"label={quote(label)}"] if label is not None else []
+    result += [f"{quote(k)}={quote(v)}" for k, v in sorted(attrs.items()) if v is not None]
+    return " ".join(result)
+
+
+def attr_list(label: Optional[str], attrs: dict) -> str:
+    content = a_list(label, attrs)
+    return f" [{content}]" if content else ""
+
+
+def statement(kw: Optional[str], attrs: dict) -> str:
+    """An attribute statement, like Digraph.attr(kw, **attrs)."""
+    if kw is None:
+        return f"\t{a_list(None, attrs)}\n"
+    return f"\t{kw}{attr_list(None, attrs)}\n"
+
+
+class DotSource:
+    """The DOT source of a Diagram, written line by line each time it is iterated.
+
+    Produces exactly what get_dot's Digraph would, without building the graph
+    or its source in memory: the lines can go straight to Graphviz's stdin or
+    to a file. Like a Digraph it has ``engine`` and ``source`` (which does join
+    everything), so it can be passed wherever one is expected.
+    """
+
+    def __init__(self, diagram: Diagram, options=None, image_paths: Dict[str, str] = None):
+        self.options = options or {}
+        self.diagram = diagram = apply_level_of_detail(diagram, self.options)
+        if image_paths is None:
+            image_paths = prefetch_images(diagram, self.options.get("image_cache"),
+                                          self.options.get("image_workers", DEFAULT_IMAGE_WORKERS),
+                                          get_profile(self.options), self.options.get("image_dpi"))
+        self.image_paths = image_paths
+        self.engine = choose_engine(diagram, self.options)
+        self.positions = seed_positions(self.options, self.engine)
+        self.format = "svg"
+
+    @property
+    def source(self) -> str:
+        return "".join(self)
+
+    def __iter__(self) -> Iterator[str]:
+        # Only the time spent writing lines counts, not the consumer's
+        elapsed = 0.0
+        start = time.perf_counter()
+        for line in self._lines():
+            elapsed += time.perf_counter() - start
+            yield line
+            start = time.perf_counter()
+        elapsed += time.perf_counter() - start
+        get_profile(self.options).add_time("get_dot", elapsed)
+
+    def write(self, out: TextIO) -> int:
+        """Writes the source to a text file; returns the number of characters."""
+        written = 0
+        for line in self:
+            written += out.write(line)
+        return written
+
+    def _lines(self) -> Iterator[str]:
+        diagram = self.diagram
+        yield "digraph {\n"
+        for kw, attrs in graph_statements(diagram, self.options, self.engine):
+            yield statement(kw, attrs)
+
+        yield from self._clusters(build_cluster_hierarchy(diagram), "c", "\t")
+
+        for node in diagram.nodes.values():
+            if not node.cluster:
+                yield self._node(node)
+
+        for rel in diagram.relations:
+            yield (f"\t{quote_edge(rel.source_key)} -> {quote_edge(rel.target_key)}"
+                   f"{attr_list(rel.label or '', edge_attributes(rel))}\n")
+        yield "}\n"
+
+    def _node(self, node) -> str:
+        attrs = node_attributes(node, self.image_paths, bool(self.options.get("compact_labels")),
+                                self.positions.get(node.key))
+        label = attrs.pop("label", None)
+        return f"\t{quote(node.key)}{attr_list(label, attrs)}\n"
+
+    def _clusters(self, cluster_dict: dict, prefix: str, indent: str) -> Iterator[str]:
+        # Digraph.subgraph indents every line of a subgraph once more per nesting level
+        for i, (name, data) in enumerate(cluster_dict.items()):
+            cluster_id = f"{prefix}_{i}"
+            yield f"{indent}subgraph {quote('cluster_' + cluster_id)} {{\n"
+            for kw, attrs in cluster_statements(name, data.get("metadata_node")):
+                yield indent + statement(kw, attrs)
+            for node in data["nodes"]:
+                yield indent + self._node(node)
+            if data["subclusters"]:
+                yield from self._clusters(data["subclusters"], cluster_id, indent + "\t")
+            yield f"{indent}}}\n"
+
@@ -0,0 +1,132 @@
+import logging
+import subprocess
+import tempfile
+import threading
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+import graphviz
+from src.profiling import NULL_PROFILE, Profile
+
+CHUNK_SIZE = 64 * 1024
+
+# Engine to retry with when a layout runs out of time: each is cheaper than the last
+FALLBACK_ENGINES = {"dot": "sfdp", "neato": "sfdp", "fdp": "sfdp", "sfdp": "osage"}
+
+logger = logging.getLogger(__name__)
+
+
+class GraphvizTimeout(TimeoutError):
+    """Graphviz did not finish the layout within the time limit and was killed."""
+
+    def __init__(self, engine: str, timeout: float):
+        super().__init__(f"{engine} did not finish the layout in {timeout:g}s")
+        self.engine = engine
+        self.timeout = timeout
+
+
+def pipe_stream(source: Union[str, Iterable[str]], engine: str = "dot", fmt: Optional[str] = "svg",
+                chunk_size: int = CHUNK_SIZE, timeout: Optional[float] = None,
+                outputs: Optional[Dict[str, str]] = None) -> Iterator[bytes]:
+    """Runs Graphviz on a DOT source and yields its output in chunks as it arrives.
+
+    Unlike ``Digraph.pipe`` the output is never held in memory as a whole. The
+    source may be a string or an iterable of string pieces; it is written to the
+    process from a background thread so stdin and stdout never block each other.
+    Raises ``graphviz.ExecutableNotFound`` or ``graphviz.CalledProcessError``
+    like the graphviz package does.
+
+    timeout limits the layout, i.e. the seconds until the first output byte;
+    past it the process is killed and ``GraphvizTimeout`` is raised before
+    anything has been yielded.
+
+    outputs maps more formats to files Graphviz writes them to, all from the
+    same layout. fmt may then be None if nothing is wanted on stdout.
+    """
+    cmd = [str(graphviz.DOT_BINARY), f"-K{engine}"]
+    # The n-th -o goes with the n-th -T, so the stdout format comes last, without -o
+    for out_fmt, path in (outputs or {}).items():
+        cmd += [f"-T{out_fmt}", f"-o{path}"]
+    if fmt:
+        cmd.append(f"-T{fmt}")
+    pieces = [source] if isinstance(source, str) else source
+
+    with tempfile.TemporaryFile() as stderr:
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr)
+        except FileNotFoundError as e:
+            raise graphviz.ExecutableNotFound(cmd) from e
+
+        def feed():
+            try:
+                for piece in pieces:
+                    proc.stdin.write(piece.encode("utf-8"))
+            except BrokenPipeError:
+                pass  # Graphviz exited early; its exit code tells why
+            finally:
+                try:
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+
+        expired = threading.Event()
+
+        def expire():
+            expired.set()
+            proc.kill()
+
+        timer = threading.Timer(timeout, expire) if timeout else None
+        writer = threading.Thread(target=feed, daemon=True)
+        writer.start()
+        if timer:
+            timer.start()
+        try:
+            while True:
+                # read1 returns whatever has arrived, so the first byte stops the timer
+                # instead of a full chunk (or the end of a small output)
+                chunk = proc.stdout.read1(chunk_size)
+                if timer:
+                    # Output only starts once the layout is done
+                    timer.cancel()
+                    timer = None
+                    if expired.is_set():
+                        break
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            if timer:
+                timer.cancel()
+            proc.stdout.close()
+            writer.join()
+            returncode = proc.wait()
+
+        if expired.is_set():
+            raise GraphvizTimeout(engine, timeout)
+        if returncode != 0:
+            stderr.seek(0)
+            raise graphviz.CalledProcessError(returncode, cmd, stderr=stderr.read())
+
+
+def pipe_with_fallback(source: Union[str, Iterable[str]], engine: str = "dot", fmt: Optional[str] = "svg",
+                       timeout: Optional[float] = None, outputs: Optional[Dict[str, str]] = None,
+                       profile: Profile = NULL_PROFILE) -> Iterator[bytes]:
+    """pipe_stream that retries with the next engine in FALLBACK_ENGINES on a timeout.
+
+    An iterable source must be iterable more than once (a list, a Digraph or
+    a DotSource), since each attempt reads it again. Each attempt gets the
+    full timeout. The last engine of the chain failing
+    to finish in time raises ``GraphvizTimeout``. Each fallback is logged as
+    a warning and counted as "layout_fallbacks" in profile. The generator
+    returns the engine that produced the output.
+    """
+    while True:
+        try:
+            yield from pipe_stream(source, engine, fmt, timeout=timeout, outputs=outputs)
+            return engine
+        except GraphvizTimeout as e:
+            fallback = FALLBACK_ENGINES.get(engine)
+            if fallback is None:
+                raise
+            logger.warning("%s, falling back to %s", e, fallback)
+            profile.count("layout_fallbacks")
+            engine = fallback
@@ -1,23 +1,34 @@
+import math
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 import graphviz
 from src.domain.diagram import Diagram
-import requests
-import tempfile
+from src.domain.node import Node
+from src.domain.relation import Relation
+from src.profiling import NULL_PROFILE, Profile, get_profile
+from src.renderer.image_cache import ImageCache, default_image_cache
+from src.renderer.layout_positions import seed_positions
+from src.renderer.image_variants import downscale_image, pixel_size
+from src.renderer.render_cache import pipe_cached
+from src.renderer.svg_postprocess import write_svg
 
-def download_temp_image(url: str) -> str:
-    """Descarga una imagen y la guarda en un archivo temporal.
-       Retorna el path local para usar en Graphviz."""
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
+DEFAULT_IMAGE_WORKERS = 8
+
+ENGINES = ("dot", "sfdp", "neato", "fdp", "osage")
+AUTO_MAX_NODES = 1000   # Above either threshold "auto" switches from dot to sfdp
+AUTO_MAX_EDGES = 3000
+DOT_TUNING = ("mclimit", "nslimit", "searchsize")   # Only read by dot
 
-    suffix = os.path.splitext(url)[1] or ".png"  # adivinar extensión
-    tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-    tmp_file.write(response.content)
-    tmp_file.close()
-    # Normalizar path → usar "/" para que Graphviz lo acepte
-    path = os.path.abspath(tmp_file.name)
-    return path.replace("\\", "/")
+def download_temp_image(url: str, cache: ImageCache = None) -> str:
+    """Descarga una imagen a la caché persistente (o la reutiliza si ya está).
+       Retorna el path local para usar en Graphviz."""
+    cache = cache or default_image_cache()
+    path = cache.get(url)
+    cache.flush()
+    return path
 
 def get_width_height(image_path: str):
     #read as url and obtaine params
@@ -29,62 +40,92 @@ def get_width_height(image_path: str):
     newurl = url.split('?')[0]
     return width, height, newurl
 
-import os
-import base64
-import re
-from graphviz import Digraph
+def collect_image_urls(diagram: Diagram) -> List[str]:
+    """Distinct image URLs (without the width/height query) in node order."""
+    urls = {}
+    for node in diagram.nodes.values():
+        if node.image:
+            urls[get_width_height(node.image)[2]] = None
+    return list(urls)
 
-def render_diagram(diagram: "Diagram", output_file: str = "output_diagram", options=None) -> str:
-    dot = get_dot(diagram, options)
-
-    # Generar SVG como texto
-    svg_bytes = dot.pipe(format="svg")
-    svg_text = svg_bytes.decode("utf-8")
-
-    # Reemplazar rutas locales de <image> por base64
-    def inline_image(match):
-        href = match.group(1)
-        if os.path.isfile(href):
-            with open(href, "rb") as f:
-                b64 = base64.b64encode(f.read()).decode("utf-8")
-            return f'<image xlink:href="data:image/png;base64,{b64}"'
-        else:
-            # Si no existe el archivo, dejar la ruta original
-            return match.group(0)
-
-    svg_text = re.sub(r'<image[^>]+xlink:href="([^"]+)"', inline_image, svg_text)
-
-    # Inline stylesheet block injection
-    if getattr(diagram, "inline_stylesheet", None):
-        css_text = str(diagram.inline_stylesheet)
-        style_tag = "<style type=\"text/css\">\n" + css_text + "\n</style>\n"
-        # Insertar después del <svg ...>
-        start = svg_text.find("<svg")
-        if start != -1:
-            insert_pos = svg_text.find(">", start)
-            if insert_pos != -1:
-                svg_text = svg_text[: insert_pos + 1] + "\n" + style_tag + svg_text[insert_pos + 1 :]
-
-    # Guardar SVG final
-    output_path = os.path.join(os.getcwd(), f"{output_file}.svg")
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(svg_text)
-
-    return output_path
-
-
-def get_dot(diagram: Diagram,  options=None) :
-    if options is None:
-        options = {}
+def prefetch_images(diagram: Diagram, cache: ImageCache = None, max_workers: int = DEFAULT_IMAGE_WORKERS,
+                    profile: Profile = NULL_PROFILE, dpi: Optional[float] = None) -> Dict[str, str]:
+    """Descarga en paralelo todas las imágenes del diagrama antes de construir el DOT.
+       Retorna un mapa URL → path local.
 
-    # Configure for SVG output
-    dot = graphviz.Digraph(format="svg", engine="dot")
+       With dpi, each image is also downscaled to the size its node shows it at
+       (see downscale_image), under the key (width, height, URL) of get_width_height."""
+    cache = cache or default_image_cache()
+    urls = collect_image_urls(diagram)
+    if not urls:
+        return {}
+    downloads, downloaded = cache.downloads, cache.bytes_downloaded
+    with profile.phase("images"):
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as pool:
+            paths = dict(zip(urls, pool.map(cache.get, urls)))
+            if dpi:
+                sizes = list(dict.fromkeys(get_width_height(node.image) for node in diagram.nodes.values() if node.image))
+                variants = pool.map(lambda size: downscale_image(paths[size[2]], pixel_size(size[0], size[1], dpi),
+                                                                 cache.variants_dir, cache.content_hash(size[2])),
+                                    sizes)
+                paths.update(zip(sizes, variants))
+        cache.flush()
+    profile.count("image_downloads", cache.downloads - downloads)
+    profile.count("image_bytes_downloaded", cache.bytes_downloaded - downloaded)
+    return paths
 
-    # Graph attributes
-    dot.attr(rankdir=options.get("rankdir", "LR"))
-    dot.attr(nodesep=options.get("nodesep", "0.6"))
-    dot.attr(ranksep=options.get("ranksep", "0.7"))
-    dot.attr("node", shape="record", style="filled")
+def node_attributes(node: Node, image_paths: Dict[str, str], compact: bool = False, pos: Optional[str] = None) -> dict:
+    """Graphviz attributes for a node, using prefetched local paths for images.
+       compact leaves the VAR/FUNC sections out of the label; pos is a
+       position from a previous layout (see LayoutPositions)."""
+    color = getattr(node, "color", None) or "lightblue"
+    node_kwargs = {"fillcolor": color, "label": node.to_graphviz(compact)}
+    if node.shape: node_kwargs["shape"] = node.shape
+    if node.css_class: node_kwargs["class"] = node.css_class
+    if node.image:
+        width, height, url = get_width_height(node.image)
+        variant = image_paths.get((width, height, url))
+        node_kwargs["image"] = variant or image_paths[url]
+        if variant:
+            # Downscaled to the node's size: scale it back to fill the node
+            node_kwargs["imagescale"] = "true"
+        node_kwargs["labelloc"] = "b"
+        node_kwargs["fixedsize"] = "true"
+        node_kwargs["width"] = width if width else "1.0"
+        node_kwargs["height"] = height if height else "1.0"
+        del node_kwargs["label"]
+        node_kwargs["shape"] = "box"
+    if pos: node_kwargs["pos"] = pos
+    return node_kwargs
+
+def choose_engine(diagram: Diagram, options=None) -> str:
+    """Layout engine for the diagram: options["engine"], or for "auto" dot up
+    to the node/edge thresholds and sfdp, which scales much better, above them."""
+    options = options or {}
+    engine = options.get("engine") or "dot"
+    if engine != "auto":
+        return engine
+    too_big = (len(diagram.nodes) > options.get("auto_max_nodes", AUTO_MAX_NODES)
+               or len(diagram.relations) > options.get("auto_max_edges", AUTO_MAX_EDGES))
+    return "sfdp" if too_big else "dot"
+
+def graph_statements(diagram: Diagram, options: dict, engine: str) -> List[Tuple[Optional[str], dict]]:
+    """Graph-level attribute statements, as (keyword, attributes) in output order.
+
+    A keyword of None sets graph attributes directly (``rankdir=LR``); "node"
+    and "graph" give ``node [...]`` / ``graph [...]`` statements.
+    """
+    statements = [
+        (None, {"rankdir": options.get("rankdir", "LR")}),
+        (None, {"nodesep": options.get("nodesep", "0.6")}),
+        (None, {"ranksep": options.get("ranksep", "0.7")}),
+    ]
+    if engine == "dot":
+        # Limits on dot's crossing minimization and network simplex passes
+        tuning = {name: str(options[name]) for name in DOT_TUNING if options.get(name) is not None}
+        if tuning:
+            statements.append((None, tuning))
+    statements.append(("node", {"shape": "record", "style": "filled"}))
 
     # External stylesheet for SVG (if provided)
     if getattr(diagram, "stylesheet", None):
@@ -94,14 +135,18 @@ def get_dot(diagram: Diagram,  options=None) :
             if not href.is_absolute():
                 # Resolve relative to current working dir
                 href = (Path(os.getcwd()) / href).resolve()
-            dot.attr("graph", stylesheet=href.as_uri())
+            statements.append(("graph", {"stylesheet": href.as_uri()}))
         except (ValueError, OSError, TypeError):
             # Fallback: pass through the raw value
-            dot.attr("graph", stylesheet=str(diagram.stylesheet))
+            statements.append(("graph", {"stylesheet": str(diagram.stylesheet)}))
+    return statements
 
-    # --- Cluster Processing ---
-    # A nested dictionary to hold cluster hierarchy
-    # e.g., { "parent": { "nodes": [], "subclusters": { "child": { ... } } } }
+def build_cluster_hierarchy(diagram: Diagram) -> dict:
+    """Nested clusters in order of first appearance.
+
+    e.g. { "parent": { "nodes": [], "subclusters": { "child": { ... } }, "metadata_node": node } }
+    where metadata_node is the first node of the cluster, which styles it.
+    """
     cluster_hierarchy = {}
 
     def find_or_create_cluster_path(path):
@@ -113,11 +158,8 @@ def get_dot(diagram: Diagram,  options=None) :
             level = level[part]["subclusters"]
         return level
 
-    # Populate the hierarchy
     for node in diagram.nodes.values():
         if node.cluster:
-            full_path = node.cluster_path + [node.cluster]
-            
             # Get the immediate parent level for this node's cluster
             parent_path = node.cluster_path
             parent_level = cluster_hierarchy
@@ -127,98 +169,165 @@ def get_dot(diagram: Diagram,  options=None) :
             # Ensure the node's own cluster exists at that level
             if node.cluster not in parent_level:
                  parent_level[node.cluster] = {"nodes": [], "subclusters": {}, "metadata_node": node}
-            
+
             # Add node to its direct cluster
             parent_level[node.cluster]["nodes"].append(node)
-            
+
             # Store the first node that defines metadata for this cluster
             if "metadata_node" not in parent_level[node.cluster]:
                 parent_level[node.cluster]["metadata_node"] = node
+    return cluster_hierarchy
+
+def cluster_statements(name: str, metadata_node: Optional[Node]) -> List[Tuple[Optional[str], dict]]:
+    """Attribute statements of a cluster subgraph, styled by its first node."""
+    statements = [(None, {"label": name})]
+    if metadata_node:
+        if metadata_node.cluster_class:
+            statements.append(("graph", {"class": metadata_node.cluster_class}))
+        if metadata_node.cluster_style:
+            statements.append((None, {"style": metadata_node.cluster_style}))
+        if metadata_node.cluster_color:
+            statements.append((None, {"color": f"#{metadata_node.cluster_color}" if not metadata_node.cluster_color.startswith('#') else metadata_node.cluster_color}))
+        if metadata_node.cluster_bgcolor:
+            statements.append((None, {"bgcolor": f"#{metadata_node.cluster_bgcolor}" if not metadata_node.cluster_bgcolor.startswith('#') else metadata_node.cluster_bgcolor}))
+    return statements
 
+def edge_attributes(rel: Relation) -> dict:
+    """Graphviz attributes for a relation, besides its label."""
+    edge_kwargs = {}
+    if getattr(rel, "style", None):
+        edge_kwargs["style"] = rel.style
+    if getattr(rel, "color", None):
+        edge_kwargs["color"] = rel.color
+    if getattr(rel, "css_class", None):
+        edge_kwargs["class"] = rel.css_class
+    if getattr(rel, "arrowhead", None):
+        edge_kwargs["arrowhead"] = rel.arrowhead
+    if getattr(rel, "arrowtail", None):
+        edge_kwargs["arrowtail"] = rel.arrowtail
+    if getattr(rel, "dir", None):
+        edge_kwargs["dir"] = rel.dir
+    if getattr(rel, "count", None):
+        # Aggregate of several relations (collapsed clusters): heavier and thicker
+        edge_kwargs["weight"] = str(rel.count)
+        edge_kwargs["penwidth"] = f"{1 + math.log2(rel.count):.2f}"
+    return edge_kwargs
 
+import os
+from graphviz import Digraph
+
+def render_diagram(diagram: "Diagram", output_file: str = "output_diagram", options=None, dot=None) -> str:
+    return render_formats(diagram, output_file, ["svg"], options, dot)[0]
+
+
+def render_formats(diagram: "Diagram", output_file: str, formats: List[str], options=None, dot=None) -> List[str]:
+    """Writes the diagram in each Graphviz format (svg, png, pdf...) from a single layout.
+
+    Returns the output paths in the order of formats. Only the SVG gets the
+    inline stylesheet and embedded images.
+    """
+    profile = get_profile(options)
+    paths = {fmt: os.path.join(os.getcwd(), f"{output_file}.{fmt}") for fmt in formats}
+    others = {fmt: path for fmt, path in paths.items() if fmt != "svg"}
+    if dot is None and options and options.get("split_components"):
+        if others:
+            raise ValueError("split components are packed into one SVG; other formats are not supported")
+        # Componentes independientes: un proceso de Graphviz por componente, en paralelo
+        from src.renderer.component_layout import layout_components  # importa este módulo
+        svg_chunks = layout_components(diagram, options, max_workers=options.get("layout_workers"))
+        positions = None
+    else:
+        if dot is None:
+            # DOT escrito línea a línea directamente al stdin de Graphviz
+            from src.renderer.dot_writer import DotSource  # importa este módulo
+            dot = DotSource(diagram, options)
+        # Generar el SVG por partes (reutilizando un render idéntico si está en caché):
+        # las imágenes se incrustan en base64 y el stylesheet se inyecta al vuelo.
+        # Los demás formatos salen del mismo proceso de Graphviz, directo a su archivo
+        # Node positions for the next layout come from a JSON output of the same run
+        positions = options.get("layout_positions") if options else None
+        positions_path = os.path.join(os.getcwd(), f"{output_file}.layout.json")
+        outputs = dict(others, json=positions_path) if positions is not None else others
+        svg_chunks = pipe_cached(dot, "svg" if "svg" in paths else None, options,
+                                 options.get("render_cache") if options else None, outputs)
+
+    if "svg" in paths:
+        # Graphviz and the post-processor run interleaved: time spent waiting for
+        # chunks is Graphviz's, the rest is post-processing
+        waited = profile.timings.get("graphviz", 0.0)
+        start = time.perf_counter()
+        write_svg(profile.timed_chunks("graphviz", svg_chunks), paths["svg"],
+                  getattr(diagram, "inline_stylesheet", None), profile)
+        waited = profile.timings.get("graphviz", 0.0) - waited
+        profile.add_time("postprocess", time.perf_counter() - start - waited)
+    else:
+        for _ in profile.timed_chunks("graphviz", svg_chunks):
+            pass
+    for fmt, path in others.items():
+        profile.count(f"{fmt}_bytes", os.path.getsize(path))
+    if positions is not None:
+        try:
+            positions.update_from_json(positions_path, keep=diagram.nodes)
+        finally:
+            os.remove(positions_path)
+        positions.save()
+
+    return list(paths.values())
+
+
+def get_dot(diagram: Diagram,  options=None, image_paths: Dict[str, str] = None) :
+    if options is None:
+        options = {}
+    profile = get_profile(options)
+    # Clusters collapsed by --max-depth / --collapse, before images and engine are chosen
+    from src.renderer.level_of_detail import apply_level_of_detail  # importa este módulo
+    diagram = apply_level_of_detail(diagram, options)
+    compact = bool(options.get("compact_labels"))
+    if image_paths is None:
+        # Fetch every distinct image up front instead of one at a time while walking nodes
+        image_paths = prefetch_images(diagram, options.get("image_cache"), options.get("image_workers", DEFAULT_IMAGE_WORKERS),
+                                      profile, options.get("image_dpi"))
+    start = time.perf_counter()
+
+    # Configure for SVG output
+    engine = choose_engine(diagram, options)
+    dot = graphviz.Digraph(format="svg", engine=engine)
+    positions = seed_positions(options, engine)
+
+    # Graph attributes
+    for kw, attrs in graph_statements(diagram, options, engine):
+        dot.attr(kw, **attrs)
+
+    # --- Cluster Processing ---
     def render_cluster_recursively(subgraph_container, cluster_dict, cluster_id_prefix="c"):
         """Recursively renders clusters and their nodes."""
         for i, (name, data) in enumerate(cluster_dict.items()):
             cluster_id = f"{cluster_id_prefix}_{i}"
-            # Use the metadata_node to get style attributes
-            metadata_node = data.get("metadata_node")
-
             with subgraph_container.subgraph(name=f"cluster_{cluster_id}") as sub:
-                sub.attr(label=name)
-                if metadata_node:
-                    if metadata_node.cluster_class:
-                        sub.attr("graph", _attributes={"class": metadata_node.cluster_class})
-                    if metadata_node.cluster_style:
-                        sub.attr(style=metadata_node.cluster_style)
-                    if metadata_node.cluster_color:
-                        sub.attr(color=f"#{metadata_node.cluster_color}" if not metadata_node.cluster_color.startswith('#') else metadata_node.cluster_color)
-                    if metadata_node.cluster_bgcolor:
-                        sub.attr(bgcolor=f"#{metadata_node.cluster_bgcolor}" if not metadata_node.cluster_bgcolor.startswith('#') else metadata_node.cluster_bgcolor)
+                for kw, attrs in cluster_statements(name, data.get("metadata_node")):
+                    sub.attr(kw, **attrs)
 
                 # Render nodes within this cluster
                 for node in data["nodes"]:
-                    color = getattr(node, "color", None) or "lightblue"
-                    node_kwargs = {"fillcolor": color, "label": node.to_graphviz()}
-                    if node.shape: node_kwargs["shape"] = node.shape
-                    if node.css_class: node_kwargs["class"] = node.css_class
-                    if node.image:
-                        width, height, url = get_width_height(node.image)
-                        local_image_path = download_temp_image(url)
-                        node_kwargs["image"] = local_image_path
-                        node_kwargs["labelloc"] = "b"
-                        node_kwargs["fixedsize"] = "true"
-                        node_kwargs["width"] = width if width else "1.0"
-                        node_kwargs["height"] = height if height else "1.0"
-                        del node_kwargs["label"]
-                        node_kwargs["shape"] = "box"
-                    sub.node(node.key, **node_kwargs)
+                    sub.node(node.key, **node_attributes(node, image_paths, compact, positions.get(node.key)))
 
                 # Render subclusters
                 if data["subclusters"]:
                     render_cluster_recursively(sub, data["subclusters"], cluster_id)
 
     # Start rendering from the top level of the hierarchy
-    render_cluster_recursively(dot, cluster_hierarchy)
+    render_cluster_recursively(dot, build_cluster_hierarchy(diagram))
     # --- End Cluster Processing ---
 
     # Render nodes not in any cluster
     for node in diagram.nodes.values():
         if node.cluster:
             continue
-        color = getattr(node, "color", None) or "lightblue"
-        node_kwargs = {"fillcolor": color}
-        if getattr(node, "shape", None):
-            node_kwargs["shape"] = node.shape
-        if getattr(node, "css_class", None):
-            node_kwargs["class"] = node.css_class
-        if getattr(node, "image", None):
-            if node.image:
-                width, height, url = get_width_height(node.image)
-                local_image_path = download_temp_image(url)
-                node_kwargs["image"] = local_image_path
-                node_kwargs["labelloc"] = "b"
-                node_kwargs["fixedsize"] = "true"
-                node_kwargs["width"] = width if width else "1.0"
-                node_kwargs["height"] = height if height else "1.0"
-                del node_kwargs["label"]
-                node_kwargs["shape"] = "box"
-        dot.node(node.key, node.to_graphviz(), **node_kwargs)
+        dot.node(node.key, **node_attributes(node, image_paths, compact, positions.get(node.key)))
 
     # Add relations
     for rel in diagram.relations:
-        edge_kwargs = {}
-        if getattr(rel, "style", None):
-            edge_kwargs["style"] = rel.style
-        if getattr(rel, "color", None):
-            edge_kwargs["color"] = rel.color
-        if getattr(rel, "css_class", None):
-            edge_kwargs["class"] = rel.css_class
-        if getattr(rel, "arrowhead", None):
-            edge_kwargs["arrowhead"] = rel.arrowhead
-        if getattr(rel, "arrowtail", None):
-            edge_kwargs["arrowtail"] = rel.arrowtail
-        if getattr(rel, "dir", None):
-            edge_kwargs["dir"] = rel.dir
-        dot.edge(rel.source_key, rel.target_key, label=rel.label or "", **edge_kwargs)
-        
+        dot.edge(rel.source_key, rel.target_key, label=rel.label or "", **edge_attributes(rel))
+
+    profile.add_time("get_dot", time.perf_counter() - start)
     return dot
\ No newline at end of file
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from src.renderer.image_variants import VARIANTS_DIR, variant_source
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "grarkdown", "images")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024   # 256 MiB
+DEFAULT_MAX_AGE = 3600                  # Seconds an entry is trusted without revalidating
+DEFAULT_POOL_SIZE = 16                  # Keep-alive connections per host
+DEFAULT_TIMEOUT = 30                    # Seconds to wait for a server to connect or send data
+
+
+class ImageCache:
+    """Persistent, content-addressed cache for node images.
+
+    Downloaded files are stored once per content hash (``<sha256><ext>``), and
+    ``index.json`` maps each URL to its blob together with the ``ETag`` and
+    ``Last-Modified`` validators sent by the server. Entries younger than
+    ``max_age`` are served straight from disk; older ones are revalidated with
+    a conditional GET. When the blobs exceed ``max_bytes`` the least recently
+    used URLs are evicted; the downscaled variants of a blob (see
+    image_variants, kept under ``variants/``) count towards its size and go
+    with it. In ``offline`` mode the network is never touched.
+    Cache hits only record their use in memory; ``flush`` writes it to the
+    index, once per render (``prefetch_images`` does it).
+
+    Downloads share one pooled ``requests.Session`` and ``get`` is thread-safe,
+    so several images can be fetched concurrently (see ``prefetch_images``).
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE, offline: bool = False, pool_size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.cache_dir = os.path.abspath(cache_dir or os.environ.get("GRARKDOWN_IMAGE_CACHE", DEFAULT_CACHE_DIR))
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.offline = offline
+        self.timeout = timeout
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self.variants_dir = os.path.join(self.cache_dir, VARIANTS_DIR)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.entries: Dict[str, dict] = self._load_index()
+        self._evicted = set()
+        self._dirty = False         # last_used times not yet in index.json
+        self._lock = threading.Lock()
+        self.bytes_downloaded = 0   # Statistics, e.g. for the render profile
+        self.downloads = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _read_index(self) -> Dict[str, dict]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load_index(self) -> Dict[str, dict]:
+        # Drop entries whose blob has been removed behind our back
+        return {url: e for url, e in self._read_index().items() if os.path.isfile(self._blob_path(e))}
+
+    def _save_index(self):
+        # Other processes (e.g. batch workers) may share the directory: keep what they added
+        for url, entry in self._read_index().items():
+            if url not in self.entries and url not in self._evicted:
+                self.entries[url] = entry
+        # Write to a temp file and rename so concurrent renders never read a partial index
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+
+    def flush(self):
+        """Writes the last_used times of cache hits to index.json, if any changed."""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def _blob_path(self, entry: dict) -> str:
+        return os.path.join(self.cache_dir, entry["hash"] + entry["suffix"])
+
+    def _store(self, url: str, content: bytes, response: requests.Response) -> dict:
+        digest = hashlib.sha256(content).hexdigest()
+        suffix = os.path.splitext(url.split("?")[0])[1] or ".png"  # adivinar extensión
+        entry = {
+            "hash": digest,
+            "suffix": suffix,
+            "size": len(content),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        blob_path = self._blob_path(entry)
+        if not os.path.isfile(blob_path):
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, blob_path)
+        return entry
+
+    def content_hash(self, url: str) -> Optional[str]:
+        """sha256 of the cached content of url, if it is in the cache."""
+        with self._lock:
+            entry = self.entries.get(url)
+            return entry["hash"] if entry else None
+
+    def _variants(self) -> Dict[str, List[Tuple[str, int]]]:
+        """(path, size) of the downscaled variants of each blob, by content hash."""
+        variants: Dict[str, List[Tuple[str, int]]] = {}
+        try:
+            with os.scandir(self.variants_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        variants.setdefault(variant_source(entry.name), []).append((entry.path, entry.stat().st_size))
+        except OSError:
+            pass    # No variants yet
+        return variants
+
+    def _release(self, entry: dict):
+        """Deletes the blob of an entry no longer in the index, and its variants,
+        unless another URL still has the same content."""
+        in_use = [e for e in self.entries.values() if e["hash"] == entry["hash"]]
+        paths = []
+        if not any(e["suffix"] == entry["suffix"] for e in in_use):
+            paths.append(self._blob_path(entry))
+        if not in_use:
+            paths.extend(path for path, _ in self._variants().get(entry["hash"], ()))
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self, keep: str):
+        """Removes least recently used URLs until the blobs and their variants fit in max_bytes."""
+        # Content-addressed blobs may be shared by several URLs
+        variants = self._variants()
+        blob_sizes = {}
+        blob_refs = {}
+        for entry in self.entries.values():
+            blob = entry["hash"] + entry["suffix"]
+            blob_sizes[blob] = entry["size"] + sum(size for _, size in variants.get(entry["hash"], ()))
+            blob_refs[blob] = blob_refs.get(blob, 0) + 1
+        total = sum(blob_sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        for url, entry in sorted(self.entries.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if url == keep:
+                continue
+            del self.entries[url]
+            self._evicted.add(url)
+            blob = entry["hash"] + entry["suffix"]
+            blob_refs[blob] -= 1
+            if blob_refs[blob] == 0:
+                total -= blob_sizes[blob]
+                for path in [os.path.join(self.cache_dir, blob)] + [path for path, _ in variants.get(entry["hash"], ())]:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def get(self, url: str, session: Optional[requests.Session] = None) -> str:
+        """Returns a local path for the image at ``url``, downloading it if needed."""
+        now = time.time()
+
+        with self._lock:
+            entry = self.entries.get(url)
+            if entry is None and self.offline:
+                raise FileNotFoundError(f"Image not in cache and offline mode is enabled: {url}")
+
+            if entry is not None and (self.offline or now - entry["validated"] < self.max_age):
+                entry["last_used"] = now
+                self._dirty = True
+                # Normalizar path → usar "/" para que Graphviz lo acepte
+                return self._blob_path(entry).replace("\\", "/")
+
+            headers = {}
+            if entry is not None:
+                if entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                    headers["If-Modified-Since"] = entry["last_modified"]
+
+        # The download itself runs outside the lock so fetches can overlap
+        response = (session or self.session).get(url, headers=headers, timeout=self.timeout)
+        if entry is None or response.status_code != 304:
+            response.raise_for_status()
+
+        with self._lock:
+            self.downloads += 1
+            self.bytes_downloaded += len(response.content)
+            if entry is not None and response.status_code == 304:
+                # Still valid: the server may refresh the validators
+                entry["etag"] = response.headers.get("ETag", entry.get("etag"))
+                entry["last_modified"] = response.headers.get("Last-Modified", entry.get("last_modified"))
+            else:
+                entry = self._store(url, response.content, response)
+            previous = self.entries.get(url)
+            entry["validated"] = now
+            entry["last_used"] = now
+            self.entries[url] = entry
+            if previous is not None and previous is not entry:
+                # New content for a known URL: the old blob may now be unused
+                self._release(previous)
+            self._evict(keep=url)
+            self._save_index()
+            return self._blob_path(entry).replace("\\", "/")
+
+
+_default_cache: Optional[ImageCache] = None
+
+def default_image_cache() -> ImageCache:
+    """Returns the process-wide cache stored in the default location."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ImageCache()
+    return _default_cache
@@ -0,0 +1,84 @@
+import hashlib
+import math
+import os
+import sys
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional: without it the original images are embedded
+    Image = None
+
+VARIANTS_DIR = "variants"       # Under the image cache directory
+JPEG_QUALITY = 85
+
+# Pillow format -> (format written, suffix). Other raster formats become PNG
+OUTPUT_FORMATS = {"JPEG": ("JPEG", ".jpg"), "PNG": ("PNG", ".png")}
+
+_warned = threading.Event()
+
+
+def pixel_size(width: Optional[str], height: Optional[str], dpi: float) -> Tuple[int, int]:
+    """Pixels that cover a node of width x height inches (default 1.0, like get_dot) at dpi."""
+    return (max(1, math.ceil(float(width or "1.0") * dpi)),
+            max(1, math.ceil(float(height or "1.0") * dpi)))
+
+
+def variant_name(digest: str, size: Tuple[int, int], suffix: str) -> str:
+    """File name of a variant: it starts with the source's content hash, so
+    ImageCache can find (and evict) the variants of a blob."""
+    return f"{digest}_{size[0]}x{size[1]}{suffix}"
+
+
+def variant_source(name: str) -> str:
+    """Content hash of the source of the variant called name."""
+    return name.partition("_")[0]
+
+
+def downscale_image(path: str, size: Tuple[int, int], variants_dir: str, digest: Optional[str] = None) -> str:
+    """A copy of the image at path that fits in size pixels, or path itself.
+
+    The copy keeps the aspect ratio and is re-encoded as JPEG if the source is
+    a JPEG and as PNG otherwise. It is made once per (source content, size)
+    and kept in variants_dir. digest is the sha256 of the file, if known (the
+    image cache stores it); otherwise the file is hashed. Images already small
+    enough, vector or animated images, files Pillow cannot read and every
+    image when Pillow is not installed are used as they are.
+    """
+    if Image is None:
+        if not _warned.is_set():
+            _warned.set()
+            print("Warning: Pillow is not installed; images are embedded at their original size "
+                  "(pip install pillow)", file=sys.stderr)
+        return path
+    try:
+        if digest is None:
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        # Only reads the header; the pixels are decoded by thumbnail below
+        with Image.open(path) as image:
+            if getattr(image, "is_animated", False) or (image.width <= size[0] and image.height <= size[1]):
+                return path
+            fmt, suffix = OUTPUT_FORMATS.get(image.format, OUTPUT_FORMATS["PNG"])
+            variant_path = os.path.join(variants_dir, variant_name(digest, size, suffix))
+            if os.path.isfile(variant_path):
+                return variant_path.replace("\\", "/")
+
+            image.thumbnail(size, Image.LANCZOS)
+            if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            os.makedirs(variants_dir, exist_ok=True)
+            # Temp file and rename: concurrent renders may make the same variant
+            fd, tmp_path = tempfile.mkstemp(dir=variants_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as out:
+                if fmt == "JPEG":
+                    image.save(out, fmt, quality=JPEG_QUALITY, optimize=True)
+                else:
+                    image.save(out, fmt, optimize=True)
+            os.replace(tmp_path, variant_path)
+            return variant_path.replace("\\", "/")
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # Not a raster image Pillow knows (e.g. SVG): embed it as it is
+        return path
@@ -0,0 +1,85 @@
+import json
+import math
+import os
+import tempfile
+from typing import Dict, Iterable, Optional, Tuple
+
+SEEDED_ENGINES = ("neato", "fdp")   # Engines that start from the pos of the input nodes
+POINTS_PER_INCH = 72.0
+
+
+class LayoutPositions:
+    """Node positions of previous renders, by Node.key, kept in a JSON file.
+
+    Positions are in inches, the unit neato and fdp read ``pos`` in. Each
+    render adds its positions to the ones already known (nodes hidden by
+    --focus or --max-depth keep theirs), and neato/fdp renders start from
+    them, so an edited diagram only has to place its new nodes. Nodes
+    removed from the diagram are forgotten.
+
+    Raises ValueError if path exists but is not such a file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.positions: Dict[str, Tuple[float, float]] = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return      # No layout yet
+        except ValueError as e:
+            raise ValueError(f"{path} is not valid JSON: {e}") from e
+        if not isinstance(data, dict) or not all(_is_point(xy) for xy in data.values()):
+            raise ValueError(f"{path} is not a positions file: expected a JSON object of [x, y] numbers by node key")
+        self.positions = {key: (float(x), float(y)) for key, (x, y) in data.items()}
+
+    def attributes(self, engine: str, pin: bool = False) -> Dict[str, str]:
+        """``pos`` attribute of each known node, or nothing for engines that ignore it.
+
+        pin makes the positions fixed (``pos="x,y!"``) instead of a starting point.
+        """
+        if engine not in SEEDED_ENGINES:
+            return {}
+        suffix = "!" if pin else ""
+        return {key: f"{x:.3f},{y:.3f}{suffix}" for key, (x, y) in self.positions.items()}
+
+    def update_from_json(self, json_path: str, keep: Optional[Iterable[str]] = None):
+        """Adds the node positions of a Graphviz ``-Tjson`` output.
+
+        With keep (the keys of the whole diagram, before --focus or
+        --max-depth), positions of nodes neither in keep nor in the output
+        are dropped.
+        """
+        with open(json_path, "r", encoding="utf-8") as f:
+            graph = json.load(f)
+        laid_out = set()
+        for obj in graph.get("objects", ()):
+            # Clusters have a bounding box ("bb") instead of a position
+            if "pos" in obj and "bb" not in obj:
+                x, y = (float(v) for v in obj["pos"].split(",")[:2])
+                self.positions[obj["name"]] = (round(x / POINTS_PER_INCH, 3), round(y / POINTS_PER_INCH, 3))
+                laid_out.add(obj["name"])
+        if keep is not None:
+            keep = laid_out.union(keep)
+            self.positions = {key: xy for key, xy in self.positions.items() if key in keep}
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({key: list(xy) for key, xy in self.positions.items()}, f)
+        os.replace(tmp_path, self.path)
+
+
+def _is_point(value) -> bool:
+    return (isinstance(value, list) and len(value) == 2
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v) for v in value))
+
+
+def seed_positions(options, engine: str) -> Dict[str, str]:
+    """``pos`` attributes by node key from options["layout_positions"], if any."""
+    positions = (options or {}).get("layout_positions")
+    if positions is None:
+        return {}
+    return positions.attributes(engine, bool(options.get("pin_positions")))
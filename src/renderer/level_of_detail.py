@@ -0,0 +1,268 @@
+import copy
+import weakref
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+from src.domain.diagram import Diagram
+from src.domain.graph_index import GraphIndex, graph_index
+from src.domain.node import Node
+from src.domain.relation import Relation
+from src.profiling import get_profile
+from src.renderer.graphviz_renderer import build_cluster_hierarchy
+
+ClusterPath = Tuple[str, ...]
+
+# Render options that select what part of the diagram is drawn
+OPTIONS = ("focus", "focus_depth", "focus_direction", "max_depth", "collapse")
+
+
+class ClusterSummary(Node):
+    """A collapsed cluster, drawn as one node that stands for all of its nodes."""
+    __slots__ = ("path", "size")
+
+    def __init__(self, key: str, path: ClusterPath, size: int):
+        super().__init__(path[-1], key)
+        self.path = path
+        self.size = size     # Nodes inside, at every nesting level
+        self.shape = "box3d"
+
+    def to_graphviz(self, compact: bool = False) -> str:
+        return f"{self.name}\\n({self.size} node{'s' if self.size != 1 else ''})"
+
+
+class AggregateRelation(Relation):
+    """The relations between two endpoints after collapsing, merged into one weighted edge."""
+    __slots__ = ("count",)
+
+    def __init__(self, source_key: str, target_key: str, count: int):
+        super().__init__(source_key, target_key, f"{count} relations")
+        self.count = count
+
+
+def parse_cluster_paths(paths: Union[str, Iterable[str], None]) -> Set[ClusterPath]:
+    """Cluster paths written like in ``### OPT CLUSTER``: "Platform>Billing", comma-separated in a string."""
+    if isinstance(paths, str):
+        paths = paths.split(",")
+    return {tuple(part.strip() for part in path.split(">")) for path in paths or () if path.strip()}
+
+
+def collapse_path(path: ClusterPath, max_depth: Optional[int], collapse: Set[ClusterPath]) -> Optional[ClusterPath]:
+    """The outermost collapsed cluster among path and its ancestors, if any."""
+    for depth in range(1, len(path) + 1):
+        if path[:depth] in collapse or (max_depth is not None and depth > max_depth):
+            return path[:depth]
+    return None
+
+
+def parse_keys(keys: Union[str, Iterable[str], None]) -> List[str]:
+    if isinstance(keys, str):
+        keys = keys.split(",")
+    return [key.strip() for key in keys or () if key.strip()]
+
+
+def neighbourhood(index: GraphIndex, keys: Iterable[str], depth: int, direction: str = "both") -> Set[str]:
+    """Keys at most depth relations away from keys, following them "out", "in" or "both" ways.
+
+    Breadth-first, so it only visits the neighbourhood, never the whole graph.
+    """
+    reached = set(keys)
+    frontier = deque((key, 0) for key in reached)
+    while frontier:
+        key, distance = frontier.popleft()
+        if distance == depth:
+            continue
+        for neighbour in index.neighbours(key, direction):
+            if neighbour not in reached:
+                reached.add(neighbour)
+                frontier.append((neighbour, distance + 1))
+    return reached
+
+
+def apply_focus(diagram: Diagram, options=None) -> Diagram:
+    """Only the nodes within options["focus_depth"] relations of the options["focus"] keys.
+
+    Keeps the relations between those nodes (the induced subgraph) and the
+    clusters they sit in. Returns diagram itself when there is no focus. The
+    diagram's GraphIndex is built once (see graph_index), so refocusing the
+    same diagram only costs the size of the neighbourhood.
+    """
+    options = options or {}
+    keys = parse_keys(options.get("focus"))
+    if not keys:
+        return diagram
+    unknown = [key for key in keys if key not in diagram.nodes]
+    if unknown:
+        raise ValueError(f"unknown focus key(s): {', '.join(unknown)}")
+    direction = options.get("focus_direction") or "both"
+    if direction not in ("in", "out", "both"):
+        raise ValueError(f"unsupported focus direction '{direction}'")
+    index = graph_index(diagram)
+    result = index.subgraph(neighbourhood(index, keys, options.get("focus_depth", 1), direction))
+    _keep_cluster_styles(_indexed_cluster_metadata(index), result)
+    get_profile(options).count("focus_nodes", len(result.nodes))
+    return result
+
+
+def _keep_cluster_styles(metadata: Dict[ClusterPath, Node], subset: Diagram):
+    """Gives each cluster of subset the style it has in the whole diagram.
+
+    metadata is _cluster_metadata of the whole diagram. A cluster is styled
+    by its first node; when that one was left out, the first remaining node
+    is replaced by a copy carrying its attributes.
+    """
+    first_nodes: Dict[ClusterPath, Node] = {}
+    for node in subset.nodes.values():
+        if node.cluster:
+            first_nodes.setdefault(tuple(node.cluster_path or ()) + (node.cluster,), node)
+    for path, node in first_nodes.items():
+        styled = metadata.get(path)
+        if styled is None or styled.key in subset.nodes:
+            continue
+        node = copy.copy(node)
+        for field in ("cluster_class", "cluster_style", "cluster_color", "cluster_bgcolor"):
+            setattr(node, field, getattr(styled, field))
+        subset.nodes[node.key] = node
+
+
+# _cluster_metadata of each indexed diagram, kept as long as its GraphIndex
+_index_metadata: "weakref.WeakKeyDictionary[GraphIndex, Dict[ClusterPath, Node]]" = weakref.WeakKeyDictionary()
+
+
+def _indexed_cluster_metadata(index: GraphIndex) -> Dict[ClusterPath, Node]:
+    metadata = _index_metadata.get(index)
+    if metadata is None:
+        metadata = _index_metadata[index] = _cluster_metadata(index.diagram)
+    return metadata
+
+
+def _cluster_metadata(diagram: Diagram) -> Dict[ClusterPath, Node]:
+    """The node that styles each cluster, by cluster path."""
+    metadata: Dict[ClusterPath, Node] = {}
+
+    def walk(level: dict, prefix: ClusterPath):
+        for name, data in level.items():
+            path = prefix + (name,)
+            if data.get("metadata_node"):
+                metadata[path] = data["metadata_node"]
+            walk(data["subclusters"], path)
+
+    walk(build_cluster_hierarchy(diagram), ())
+    return metadata
+
+
+def apply_level_of_detail(diagram: Diagram, options=None) -> Diagram:
+    """The part of the diagram to draw: apply_focus, then clusters collapsed
+    per options["max_depth"] and options["collapse"].
+
+    Each cluster nested deeper than max_depth levels (0 collapses even the
+    top-level ones), or named in collapse, becomes a single summary node in
+    its parent cluster. Relations crossing a collapsed boundary are merged per
+    pair of endpoints into one edge labelled and weighted with their count;
+    those inside one collapsed cluster are dropped. Returns diagram itself
+    when there is nothing to focus on or collapse.
+    """
+    options = options or {}
+    diagram = apply_focus(diagram, options)
+    max_depth = options.get("max_depth")
+    collapse = parse_cluster_paths(options.get("collapse"))
+    if max_depth is None and not collapse:
+        return diagram
+
+    # Summary node of each collapsed cluster, in order of its first node
+    summaries: Dict[ClusterPath, ClusterSummary] = {}
+    representative: Dict[str, str] = {}
+    for node in diagram.nodes.values():
+        if not node.cluster or isinstance(node, ClusterSummary):
+            continue
+        path = collapse_path(tuple(node.cluster_path or ()) + (node.cluster,), max_depth, collapse)
+        if path is None:
+            continue
+        summary = summaries.get(path)
+        if summary is None:
+            summary = summaries[path] = ClusterSummary(_summary_key(path, diagram.nodes), path, 0)
+        summary.size += 1
+        representative[node.key] = summary.key
+    if not summaries:
+        return diagram
+    get_profile(options).count("collapsed_clusters", len(summaries))
+
+    _style_summaries(diagram, summaries)
+    by_key = {summary.key: summary for summary in summaries.values()}
+    result = Diagram()
+    result.stylesheet = diagram.stylesheet
+    result.inline_stylesheet = diagram.inline_stylesheet
+    for node in diagram.nodes.values():
+        key = representative.get(node.key)
+        if key is None:
+            result.add_node(node)
+        elif key not in result.nodes:
+            # Takes the place of the cluster's first node, so clusters keep their order
+            result.add_node(by_key[key])
+
+    # Relations between kept nodes stay as they are; the others are grouped per
+    # pair of endpoints, at the position of the group's first relation
+    entries: List[Union[Relation, Tuple[str, str]]] = []
+    groups: Dict[Tuple[str, str], List[Relation]] = {}
+    for relation in diagram.relations:
+        source = representative.get(relation.source_key, relation.source_key)
+        target = representative.get(relation.target_key, relation.target_key)
+        if source == relation.source_key and target == relation.target_key:
+            entries.append(relation)
+        elif source != target:
+            if (source, target) not in groups:
+                groups[(source, target)] = []
+                entries.append((source, target))
+            groups[(source, target)].append(relation)
+    for entry in entries:
+        result.add_relation(_merge(entry, groups[entry]) if isinstance(entry, tuple) else entry)
+    return result
+
+
+def _summary_key(path: ClusterPath, nodes: Dict[str, Node]) -> str:
+    # ":" would read as a port in an edge endpoint
+    key = "cluster " + ">".join(path).replace(":", "_")
+    while key in nodes:
+        key += "_"
+    return key
+
+
+def _style_summaries(diagram: Diagram, summaries: Dict[ClusterPath, ClusterSummary]):
+    """Colours each summary like its cluster and places it in the parent cluster.
+
+    The summary also carries the parent's cluster attributes, since it may
+    become the first node of the parent, the one that styles it.
+    """
+    metadata = _cluster_metadata(diagram)
+    for path, summary in summaries.items():
+        own = metadata.get(path)
+        if own:
+            summary.color = own.cluster_bgcolor or own.cluster_color
+            if summary.color and not summary.color.startswith("#"):
+                summary.color = f"#{summary.color}"
+            summary.css_class = own.cluster_class
+        if len(path) > 1:
+            summary.cluster_path = list(path[:-2])
+            summary.cluster = path[-2]
+            parent = metadata.get(path[:-1])
+            if parent:
+                summary.cluster_class = parent.cluster_class
+                summary.cluster_style = parent.cluster_style
+                summary.cluster_color = parent.cluster_color
+                summary.cluster_bgcolor = parent.cluster_bgcolor
+
+
+def without_level_of_detail(options: dict) -> dict:
+    """options for rendering a diagram that apply_level_of_detail already reduced."""
+    return {name: value for name, value in options.items() if name not in OPTIONS}
+
+
+def _merge(endpoints: Tuple[str, str], relations: List[Relation]) -> Relation:
+    source, target = endpoints
+    if len(relations) == 1:
+        # A single crossing relation keeps its label and style, rewired to the summary
+        original = relations[0]
+        relation = Relation(source, target, original.label)
+        for field in Relation.__slots__[3:]:
+            setattr(relation, field, getattr(original, field))
+        return relation
+    return AggregateRelation(source, target, len(relations))
+
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+import graphviz
+from src.profiling import get_profile
+from src.renderer.graphviz_process import CHUNK_SIZE, pipe_with_fallback
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "grarkdown", "renders")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024   # 512 MiB
+SPOOL_MAX_BYTES = 16 * 1024 * 1024      # Larger DOT sources are spooled to a temp file
+
+# Only these options change the layout; the rest (caches, workers...) do not.
+# layout_timeout is not one of them: a layout that fell back to a cheaper
+# engine is never cached (see pipe_cached).
+LAYOUT_OPTIONS = ("rankdir", "nodesep", "ranksep", "mclimit", "nslimit", "searchsize")
+
+
+@lru_cache(maxsize=None)
+def graphviz_version() -> Tuple[int, ...]:
+    """Installed Graphviz version (runs `dot -V` once per process)."""
+    return graphviz.version()
+
+
+def source_digest(source: Union[str, Iterable[str]]) -> str:
+    """sha256 of a DOT source. It may come in pieces (a Digraph or DotSource
+    iterates its lines); they are hashed as they come, without joining them."""
+    digest = hashlib.sha256()
+    for piece in [source] if isinstance(source, str) else source:
+        digest.update(piece.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def render_key(source: Union[str, Iterable[str]], engine: str, fmt: str, options=None,
+               digest: Optional[str] = None) -> str:
+    """Hash of everything that determines Graphviz's output for a DOT source.
+
+    Pass the source's digest (see source_digest) to key several formats
+    without reading the source again.
+    """
+    options = options or {}
+    layout = {name: options.get(name) for name in LAYOUT_OPTIONS}
+    payload = json.dumps([digest or source_digest(source), engine, fmt, layout, list(graphviz_version())])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SpooledSource:
+    """A DOT source hashed as it is generated and kept for Graphviz to read.
+
+    The key of a render depends on its source, so on a miss the source would
+    otherwise be generated twice: once for the hash and once for Graphviz.
+    The copy stays in memory up to SPOOL_MAX_BYTES and goes to a temp file
+    beyond that. It can be iterated several times, like pipe_with_fallback needs.
+    """
+
+    def __init__(self, source: Union[str, Iterable[str]]):
+        self._file = tempfile.SpooledTemporaryFile(SPOOL_MAX_BYTES, mode="w+", encoding="utf-8")
+        digest = hashlib.sha256()
+        for piece in [source] if isinstance(source, str) else source:
+            digest.update(piece.encode("utf-8"))
+            self._file.write(piece)
+        self.digest = digest.hexdigest()
+
+    def __iter__(self) -> Iterator[str]:
+        self._file.seek(0)
+        while True:
+            piece = self._file.read(CHUNK_SIZE)
+            if not piece:
+                return
+            yield piece
+
+    def close(self):
+        self._file.close()
+
+
+class RenderCache:
+    """On-disk cache of Graphviz output, one file per render key.
+
+    A hit refreshes the file's modification time, so when the cache grows past
+    ``max_bytes`` the least recently used renders are deleted first.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = os.path.abspath(cache_dir or os.environ.get("GRARKDOWN_RENDER_CACHE", DEFAULT_CACHE_DIR))
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{fmt}")
+
+    def open(self, key: str, fmt: str) -> Optional[BinaryIO]:
+        """Opens a cached render for reading, or returns None on a miss."""
+        path = self._path(key, fmt)
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return None
+        os.utime(path)
+        return f
+
+    def store(self, key: str, fmt: str, chunks: Iterator[bytes],
+              keep: Optional[Callable[[], bool]] = None) -> Iterator[bytes]:
+        """Passes chunks through while writing them to the cache.
+
+        The entry only appears once the stream has been consumed completely, so
+        a failed or interrupted render is never cached. keep, if given, is asked
+        at that point whether the render should be cached after all.
+        """
+        # Write to a temp file and rename so a concurrent reader never sees half a render
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            if keep is None or keep():
+                os.replace(tmp_path, self._path(key, fmt))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._evict()
+
+    def copy_to(self, key: str, fmt: str, path: str) -> bool:
+        """Copies a cached render to path; returns False on a miss."""
+        cached = self.open(key, fmt)
+        if cached is None:
+            return False
+        with cached, open(path + ".tmp", "wb") as out:
+            shutil.copyfileobj(cached, out)
+        os.replace(path + ".tmp", path)
+        return True
+
+    def store_file(self, key: str, fmt: str, path: str):
+        """Adds a copy of a finished render file to the cache."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out, open(path, "rb") as f:
+                shutil.copyfileobj(f, out)
+            os.replace(tmp_path, self._path(key, fmt))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._evict()
+
+    def _evict(self):
+        """Deletes least recently used renders until the cache fits in max_bytes."""
+        files = []
+        total = 0
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def pipe_cached(dot: graphviz.Digraph, fmt: Optional[str], options=None, cache: Optional[RenderCache] = None,
+                outputs: Optional[Dict[str, str]] = None) -> Iterator[bytes]:
+    """Streams Graphviz's output for dot, replaying it from cache when possible.
+
+    dot may be a Digraph or a DotSource; its lines are streamed to Graphviz
+    without joining them into one string. With a cache they are read once,
+    into a SpooledSource that is hashed for the key and that Graphviz reads
+    on a miss. On a hit the Graphviz subprocess is skipped entirely. With a
+    ``layout_timeout`` option, a layout that takes longer is retried with a
+    cheaper engine (see pipe_with_fallback); that output is not cached, since
+    the key names the requested engine.
+
+    outputs maps extra formats to the files they should be written to. They
+    come from the same Graphviz run as fmt (which may be None), so the layout
+    is computed once; only the formats missing from the cache are rendered.
+    Each file appears once it is complete.
+    """
+    timeout = (options or {}).get("layout_timeout")
+    profile = get_profile(options)
+    missing = dict(outputs or {})
+    cached = None
+    keys = {}
+    source = dot
+    if cache is not None:
+        source = SpooledSource(dot)
+        keys = {f: render_key(source, dot.engine, f, options, source.digest) for f in [fmt, *missing] if f}
+        for out_fmt, path in list(missing.items()):
+            if cache.copy_to(keys[out_fmt], out_fmt, path):
+                del missing[out_fmt]
+        cached = cache.open(keys[fmt], fmt) if fmt else None
+        hits = len(outputs or {}) - len(missing) + (cached is not None)
+        profile.count("render_cache_hits", hits)
+        profile.count("render_cache_misses", len(keys) - hits)
+
+    try:
+        if missing or (fmt and cached is None):
+            run_fmt = fmt if cached is None else None
+            tmp_paths = {out_fmt: path + ".tmp" for out_fmt, path in missing.items()}
+            engines = []    # The engine that produced the output, once it is complete
+
+            def run() -> Iterator[bytes]:
+                engines.append((yield from pipe_with_fallback(source, dot.engine, run_fmt, timeout, tmp_paths,
+                                                              profile)))
+
+            def requested_engine() -> bool:
+                return engines == [dot.engine]
+
+            try:
+                chunks = run()
+                if cache is not None and run_fmt:
+                    chunks = cache.store(keys[fmt], fmt, chunks, keep=requested_engine)
+                yield from chunks
+                for out_fmt, path in missing.items():
+                    os.replace(tmp_paths[out_fmt], path)
+                    if cache is not None and requested_engine():
+                        cache.store_file(keys[out_fmt], out_fmt, path)
+            finally:
+                for tmp_path in tmp_paths.values():
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+
+        if cached is not None:
+            while True:
+                chunk = cached.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if cached is not None:
+            cached.close()
+        if source is not dot:
+            source.close()
@@ -0,0 +1,161 @@
+import base64
+import codecs
+import mimetypes
+import os
+import re
+from typing import Dict, Iterable, Optional, TextIO, Tuple
+
+IMAGE_HREF_RE = re.compile(r'xlink:href="([^"]+)"')
+TAG_ATTR_RE = re.compile(r'([\w:-]+)="([^"]*)"')
+B64_CHUNK = 3 * 16 * 1024   # Multiple of 3: chunks encode without padding
+
+# Leading bytes of the image formats Graphviz can embed
+MAGIC_NUMBERS = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"\x00\x00\x01\x00", "image/x-icon"),
+)
+
+def sniff_mime_type(path: str) -> str:
+    """MIME type of an image file from its content, falling back to its extension."""
+    with open(path, "rb") as f:
+        head = f.read(512)
+    for magic, mime in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    text = head.lstrip().lower()
+    if text.startswith(b"<svg") or (text.startswith(b"<?xml") and b"<svg" in text):
+        return "image/svg+xml"
+    return mimetypes.guess_type(path)[0] or "image/png"
+
+
+class SvgPostProcessor:
+    """Rewrites Graphviz SVG output on the fly while writing it to a file.
+
+    Text is consumed tag by tag, so only the tag currently being read is kept in
+    memory. The inline stylesheet is written right after the opening ``<svg>``
+    tag.
+
+    Each distinct local image is embedded once, as a base64 data URI inside a
+    ``<defs><symbol>`` written where the image is first used (encoded straight
+    into the output in chunks). Every ``<image>`` that shows it becomes a
+    ``<use>`` of that symbol, so a diagram with many identical icons carries a
+    single copy of the file.
+    """
+
+    def __init__(self, out: TextIO, inline_stylesheet: Optional[str] = None):
+        self.out = out
+        self.inline_stylesheet = inline_stylesheet
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._pending = ""          # Unfinished tag carried over to the next chunk
+        self._svg_seen = False
+        self._symbols: Dict[Tuple[str, str], str] = {}   # (path, preserveAspectRatio) -> symbol id
+        self._open_use = False      # An <image>...</image> pair is being rewritten
+        self.images_inlined = 0     # Distinct images embedded so far
+        self.inlined_bytes = 0      # Size of the image files embedded so far
+
+    def feed(self, chunk: bytes):
+        text = self._pending + self._decoder.decode(chunk)
+        pos = 0
+        while True:
+            start = text.find("<", pos)
+            if start == -1:
+                self.out.write(text[pos:])
+                self._pending = ""
+                return
+            end = text.find(">", start)
+            if end == -1:
+                self.out.write(text[pos:start])
+                self._pending = text[start:]
+                return
+            self.out.write(text[pos:start])
+            self._write_tag(text[start:end + 1])
+            pos = end + 1
+
+    def close(self):
+        self.out.write(self._pending + self._decoder.decode(b"", final=True))
+        self._pending = ""
+
+    def _write_tag(self, tag: str):
+        if tag.startswith("<image"):
+            match = IMAGE_HREF_RE.search(tag)
+            # Reemplazar rutas locales de <image> por una referencia al símbolo compartido
+            if match and os.path.isfile(match.group(1)):
+                self._write_use(tag, match.group(1))
+                return
+        elif tag == "</image>" and self._open_use:
+            self._open_use = False
+            self.out.write("</use>")
+            return
+        self.out.write(tag)
+
+        if not self._svg_seen and tag.startswith("<svg"):
+            self._svg_seen = True
+            if self.inline_stylesheet:
+                # Insertar después del <svg ...>
+                self.out.write("\n<style type=\"text/css\">\n" + str(self.inline_stylesheet) + "\n</style>\n")
+
+    def _write_use(self, tag: str, path: str):
+        attrs = TAG_ATTR_RE.findall(tag)
+        aspect = dict(attrs).get("preserveAspectRatio", "xMinYMin meet")
+        key = (path, aspect)
+        symbol_id = self._symbols.get(key)
+        if symbol_id is None:
+            symbol_id = f"grk_image_{len(self._symbols)}"
+            self._symbols[key] = symbol_id
+            self.images_inlined += 1
+            self.out.write(f'<defs><symbol id="{symbol_id}"><image width="100%" height="100%" '
+                           f'preserveAspectRatio="{aspect}" xlink:href="data:{sniff_mime_type(path)};base64,')
+            self._write_base64(path)
+            self.out.write('"/></symbol></defs>\n')
+
+        # Position and size stay on the <use>; they set the symbol's viewport
+        self.out.write(f'<use xlink:href="#{symbol_id}"')
+        for name, value in attrs:
+            if name not in ("xlink:href", "href", "preserveAspectRatio"):
+                self.out.write(f' {name}="{value}"')
+        if tag.endswith("/>"):
+            self.out.write("/>")
+        else:
+            self._open_use = True
+            self.out.write(">")
+
+    def _write_base64(self, path: str):
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(B64_CHUNK)
+                if not block:
+                    break
+                self.inlined_bytes += len(block)
+                self.out.write(base64.b64encode(block).decode("ascii"))
+
+
+def write_svg(chunks: Iterable[bytes], output_path: str, inline_stylesheet: Optional[str] = None,
+              profile=None) -> str:
+    """Post-processes streamed SVG output into output_path.
+
+    The file is written under a temporary name and renamed at the end, so a
+    failed render never leaves a truncated SVG behind. profile, if given,
+    receives the embedded images and bytes and the final SVG size.
+    """
+    tmp_path = output_path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            processor = SvgPostProcessor(out, inline_stylesheet)
+            for chunk in chunks:
+                processor.feed(chunk)
+            processor.close()
+        os.replace(tmp_path, output_path)
+        if profile is not None:
+            profile.count("images_inlined", processor.images_inlined)
+            profile.count("image_bytes_inlined", processor.inlined_bytes)
+            profile.count("svg_bytes", os.path.getsize(output_path))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
@@ -0,0 +1,259 @@
+import io
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import graphviz
+from src.parser.incremental_parser import IncrementalParser
+from src.parser.markdown_parser import merge_diagrams, parse_markdown
+from src.profiling import Profile, record_diagram
+from src.renderer.graphviz_process import GraphvizTimeout
+from src.renderer.dot_writer import DotSource
+from src.renderer.graphviz_renderer import ENGINES
+from src.renderer.render_cache import pipe_cached
+from src.renderer.svg_postprocess import SvgPostProcessor
+
+MAX_DOCUMENTS = 64      # Documents whose parse state is kept for incremental updates
+MAX_BODY = 32 * 1024 * 1024
+
+# Render options a request may set; caches, workers and the like stay server-wide
+REQUEST_OPTIONS = ("rankdir", "nodesep", "ranksep", "engine", "auto_max_nodes", "auto_max_edges",
+                   "mclimit", "nslimit", "searchsize", "layout_timeout", "split_components",
+                   "focus", "focus_depth", "focus_direction", "max_depth", "collapse", "compact_labels")
+STRING_OPTIONS = ("rankdir", "nodesep", "ranksep")   # Passed to Graphviz as written, like on the command line
+
+CONTENT_TYPES = {"svg": "image/svg+xml; charset=utf-8", "dot": "text/vnd.graphviz; charset=utf-8"}
+
+
+class ServerBusy(Exception):
+    """Too many renders are already waiting for a Graphviz process."""
+
+
+class GraphvizSlots:
+    """Bounds the Graphviz processes running at once.
+
+    Renders beyond max_running wait in line; beyond max_waiting more they are
+    turned away with ServerBusy instead of piling up.
+    """
+
+    def __init__(self, max_running: int, max_waiting: int):
+        self._semaphore = threading.BoundedSemaphore(max_running)
+        self._lock = threading.Lock()
+        self.max_waiting = max_waiting
+        self.waiting = 0
+
+    def __enter__(self):
+        with self._lock:
+            if self.waiting >= self.max_waiting:
+                raise ServerBusy(f"{self.waiting} renders already waiting for Graphviz")
+            self.waiting += 1
+        try:
+            self._semaphore.acquire()
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        return self
+
+    def __exit__(self, *exc):
+        self._semaphore.release()
+
+
+class _Document:
+    """Parse state of a named document: its parser and the snapshot of its last version.
+
+    Requests that resend the same text (to change the focus, say) reuse the
+    snapshot, and with it the GraphIndex cached for it.
+    """
+    __slots__ = ("parser", "lock", "text", "diagram")
+
+    def __init__(self):
+        self.parser = IncrementalParser()
+        self.lock = threading.Lock()
+        self.text: Optional[str] = None
+        self.diagram = None
+
+
+class RenderService:
+    """Renders Grarkdown text with caches and parse state kept between requests.
+
+    options are the server-wide render options (image and render caches
+    included); each request may override the layout ones. Requests that name
+    a document are parsed incrementally against its previous version.
+    """
+
+    def __init__(self, options: dict, max_graphviz: int, max_queue: int):
+        self.options = options
+        self.slots = GraphvizSlots(max_graphviz, max_queue)
+        self._documents: "OrderedDict[str, _Document]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.renders = 0
+
+    @property
+    def documents(self) -> int:
+        return len(self._documents)
+
+    def _document(self, name: str) -> _Document:
+        with self._lock:
+            entry = self._documents.pop(name, None) or _Document()
+            self._documents[name] = entry
+            while len(self._documents) > MAX_DOCUMENTS:
+                self._documents.popitem(last=False)
+            return entry
+
+    def render(self, markdown_text: str, fmt: str = "svg", overrides: Optional[dict] = None,
+               document: Optional[str] = None, profile: Optional[Profile] = None) -> bytes:
+        if not isinstance(fmt, str) or fmt not in CONTENT_TYPES:
+            raise ValueError(f"unsupported format '{fmt}'")
+        if not isinstance(overrides or {}, dict):
+            raise ValueError("options must be a JSON object")
+        if document is not None and not isinstance(document, str):
+            raise ValueError("document must be a string")
+        overrides = dict(overrides or {})
+        unknown = set(overrides) - set(REQUEST_OPTIONS)
+        if unknown:
+            raise ValueError(f"unsupported options: {', '.join(sorted(unknown))}")
+        if overrides.get("engine", "auto") not in ENGINES + ("auto",):
+            raise ValueError(f"unsupported engine '{overrides['engine']}'")
+        for name in ("max_depth", "focus_depth"):
+            if not isinstance(overrides.get(name, 0), int) or overrides.get(name, 0) < 0:
+                raise ValueError(f"{name} must be a non-negative integer")
+        for name in STRING_OPTIONS:
+            if name in overrides:
+                overrides[name] = str(overrides[name])
+        options = dict(self.options, **overrides)
+        profile = profile or Profile()
+        options["profile"] = profile
+
+        if document:
+            state = self._document(document)
+            # The parser patches one Diagram in place: render a snapshot of it
+            with state.lock:
+                if state.text != markdown_text:
+                    with profile.phase("parse"):
+                        state.diagram = merge_diagrams([state.parser.update(markdown_text)])
+                    state.text = markdown_text
+                diagram = state.diagram
+        else:
+            with profile.phase("parse"):
+                diagram = parse_markdown(markdown_text)
+        record_diagram(profile, diagram)
+        dot = None if options.get("split_components") and fmt == "svg" else DotSource(diagram, options)
+        inline_stylesheet = diagram.inline_stylesheet
+
+        if fmt == "dot":
+            self._count_render()
+            return dot.source.encode("utf-8")
+
+        out = io.StringIO()
+        processor = SvgPostProcessor(out, inline_stylesheet)
+        if dot is None:
+            # One slot per component process, taken by the layout threads themselves
+            from src.renderer.component_layout import layout_components
+            chunks = layout_components(diagram, options, max_workers=options.get("layout_workers"),
+                                       graphviz_slot=self.slots)
+            for chunk in profile.timed_chunks("graphviz", chunks):
+                processor.feed(chunk)
+        else:
+            with self.slots:
+                chunks = pipe_cached(dot, "svg", options, options.get("render_cache"))
+                for chunk in profile.timed_chunks("graphviz", chunks):
+                    processor.feed(chunk)
+        processor.close()
+        body = out.getvalue().encode("utf-8")
+        profile.count("svg_bytes", len(body))
+        self._count_render()
+        return body
+
+    def _count_render(self):
+        with self._lock:
+            self.renders += 1
+
+
+def make_handler(service: RenderService):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # Keep-alive: a preview client reuses its connection
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, json.dumps({
+                    "status": "ok",
+                    "renders": service.renders,
+                    "waiting": service.slots.waiting,
+                    "documents": service.documents,
+                }).encode("utf-8"), "application/json")
+            else:
+                self._error(404, "not found")
+
+        def do_POST(self):
+            if self.path.split("?")[0] != "/render":
+                self._error(404, "not found")
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY:
+                self._error(413, "request too large")
+                return
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+                markdown_text = request["source"]
+                fmt = request.get("format", "svg")
+                if not isinstance(markdown_text, str):
+                    raise TypeError
+            except (ValueError, KeyError, TypeError):
+                self._error(400, 'expected a JSON object with a "source" string')
+                return
+
+            profile = Profile()
+            try:
+                body = service.render(markdown_text, fmt, request.get("options"), request.get("document"), profile)
+            except ValueError as e:
+                self._error(400, str(e))
+            except ServerBusy as e:
+                self._error(503, str(e))
+            except GraphvizTimeout as e:
+                self._error(504, str(e))
+            except graphviz.CalledProcessError as e:
+                stderr = e.stderr.decode("utf-8", "replace") if isinstance(e.stderr, bytes) else str(e.stderr)
+                self._error(422, f"Graphviz failed: {stderr.strip()}")
+            except FileNotFoundError as e:   # e.g. an image missing in offline mode
+                self._error(422, str(e))
+            except Exception as e:
+                self._error(500, f"{type(e).__name__}: {e}")
+            else:
+                # Per-phase timings for the browser's network panel
+                timing = ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in profile.timings.items())
+                self._send(200, body, CONTENT_TYPES[fmt], {"Server-Timing": timing})
+
+        def _error(self, status: int, message: str):
+            self._send(status, json.dumps({"error": message}).encode("utf-8"), "application/json")
+
+        def _send(self, status: int, body: bytes, content_type: str, headers: Optional[dict] = None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host: str, port: int, options: dict, max_graphviz: int, max_queue: int):
+    """Runs the render server until interrupted.
+
+    POST /render takes {"source": "...", "format": "svg"|"dot", "options": {...},
+    "document": "id"} and answers with the SVG or DOT; GET /health reports load.
+    """
+    service = RenderService(options, max_graphviz, max_queue)
+    httpd = ThreadingHTTPServer((host, port), make_handler(service))
+    httpd.daemon_threads = True
+    print(f"Serving renders on http://{httpd.server_address[0]}:{httpd.server_address[1]} (Ctrl+C to stop)")
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
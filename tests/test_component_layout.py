@@ -0,0 +1,98 @@
+import re
+import unittest
+
+from src.domain.diagram import Diagram
+from src.domain.node import Node
+from src.domain.relation import Relation
+from src.renderer.component_layout import PACK_MARGIN, pack_svgs, split_components
+
+
+def make_diagram(nodes, relations) -> Diagram:
+    """nodes: (key, cluster, cluster_path) tuples; relations: (source, target) pairs."""
+    diagram = Diagram()
+    for key, cluster, cluster_path in nodes:
+        node = Node(key.upper(), key)
+        node.cluster = cluster
+        node.cluster_path = list(cluster_path)
+        diagram.add_node(node)
+    for source, target in relations:
+        diagram.add_relation(Relation(source, target, ""))
+    return diagram
+
+
+def svg(width: int, height: int) -> str:
+    return (f'<?xml version="1.0"?>\n<svg width="{width}pt" height="{height}pt" viewBox="0 0 {width} {height}" '
+            f'xmlns="http://www.w3.org/2000/svg">\n<g id="graph0"><g id="node1"><use href="#clip1"/>'
+            f'<path fill="url(#grad1)"/></g></g>\n</svg>\n')
+
+
+class SplitComponentsTest(unittest.TestCase):
+
+    def keys(self, parts) -> list:
+        return [list(part.nodes) for part in parts]
+
+    def test_relations_join_components(self):
+        diagram = make_diagram([(k, None, []) for k in "abcde"], [("d", "a"), ("c", "e")])
+        parts = split_components(diagram)
+        # In the order of each part's first node; nodes keep their order inside a part
+        self.assertEqual(self.keys(parts), [["a", "d"], ["b"], ["c", "e"]])
+        self.assertEqual([[(r.source_key, r.target_key) for r in p.relations] for p in parts],
+                         [[("d", "a")], [], [("c", "e")]])
+
+    def test_top_level_cluster_joins_its_nodes(self):
+        diagram = make_diagram([("a", "inner", ["outer"]), ("b", None, []), ("c", "outer", []),
+                                ("d", "other", []), ("e", "inner2", ["outer"])], [])
+        self.assertEqual(self.keys(split_components(diagram)), [["a", "c", "e"], ["b"], ["d"]])
+
+    def test_clusters_and_relations_together(self):
+        diagram = make_diagram([("a", "x", []), ("b", "y", []), ("c", "x", []), ("d", "y", [])], [("c", "d")])
+        self.assertEqual(self.keys(split_components(diagram)), [["a", "b", "c", "d"]])
+
+    def test_relation_without_nodes_is_kept(self):
+        diagram = make_diagram([("a", None, [])], [("x", "y")])
+        parts = split_components(diagram)
+        self.assertEqual(self.keys(parts), [["a"], []])
+        self.assertEqual([(r.source_key, r.target_key) for r in parts[1].relations], [("x", "y")])
+
+    def test_stylesheets_are_shared(self):
+        diagram = make_diagram([("a", None, []), ("b", None, [])], [])
+        diagram.stylesheet, diagram.inline_stylesheet = "a.css", ".a {}"
+        for part in split_components(diagram):
+            self.assertEqual((part.stylesheet, part.inline_stylesheet), ("a.css", ".a {}"))
+
+
+class PackSvgsTest(unittest.TestCase):
+
+    def pack(self, svgs) -> str:
+        return b"".join(pack_svgs(svgs)).decode("utf-8")
+
+    def placements(self, packed: str) -> list:
+        return [(float(x), float(y)) for x, y in re.findall(r'<svg x="([\d.]+)" y="([\d.]+)"', packed)]
+
+    def test_ids_are_prefixed_per_component(self):
+        packed = self.pack([svg(10, 10), svg(10, 10)])
+        self.assertEqual(re.findall(r'id="(\w+)"', packed), ["p0_graph0", "p0_node1", "p1_graph0", "p1_node1"])
+        self.assertIn('href="#p1_clip1"', packed)
+        self.assertIn('url(#p0_grad1)', packed)
+
+    def test_prolog_and_namespaces_come_from_the_first(self):
+        packed = self.pack([svg(10, 10)])
+        self.assertTrue(packed.startswith('<?xml version="1.0"?>\n<svg '))
+        self.assertIn('xmlns="http://www.w3.org/2000/svg"', packed.split("\n")[1])
+        self.assertTrue(packed.endswith("</svg>\n</svg>\n"))
+
+    def test_shelf_placement(self):
+        # Four 100x100 parts: rows about sqrt(total area) wide, so two per row
+        packed = self.pack([svg(100, 100)] * 4)
+        step_x = step_y = 100 + PACK_MARGIN
+        self.assertEqual(self.placements(packed), [(0, 0), (step_x, 0), (0, step_y), (step_x, step_y)])
+        size = 2 * 100 + PACK_MARGIN
+        self.assertIn(f'<svg width="{size:.2f}pt" height="{size:.2f}pt"', packed)
+
+    def test_wide_part_gets_its_own_row(self):
+        packed = self.pack([svg(10, 10), svg(500, 20), svg(10, 10)])
+        self.assertEqual(self.placements(packed), [(0, 0), (0, 10 + PACK_MARGIN), (0, 30 + 2 * PACK_MARGIN)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import unittest
+import warnings
+
+from graphviz.quoting import quote as graphviz_quote
+from src.parser.markdown_parser import parse_markdown
+from src.renderer.dot_writer import DotSource, quote
+from src.renderer.graphviz_renderer import collect_image_urls, get_dot
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Identifiers and labels that need every quoting rule
+ODD_NAMES = ('# {A "q" <b> \\\\x} [a]\n### OPT DESC say "hi" \\\\\n'
+             '### OPT CLUSTER node>Edge Cl [class=k, style=dashed, color=#112233, bgcolor=445566]\n'
+             '## VAR\n- x: <T>\n## END VAR\n## F_RELA\n- TO [graph] {a "b"} [style=dashed, arrowhead=vee]\n'
+             '- BI [a]\n## END F_RELA\n# {G} [graph]\n')
+
+OPTION_SETS = ({}, {"rankdir": "TB", "engine": "dot", "mclimit": 0.5, "searchsize": 10},
+               {"engine": "sfdp", "compact_labels": True}, {"max_depth": 0})
+
+
+class DotSourceTest(unittest.TestCase):
+    """DotSource writes exactly the DOT of get_dot's Digraph."""
+
+    def check_same_source(self, text: str):
+        diagram = parse_markdown(text)
+        image_paths = {url: f"/cache/{i}.png" for i, url in enumerate(collect_image_urls(diagram))}
+        for options in OPTION_SETS:
+            with self.subTest(options=options):
+                self.assertEqual(DotSource(diagram, options, image_paths).source,
+                                 get_dot(diagram, options, image_paths).source)
+
+    def test_example_files(self):
+        for name in ("test.md", "wiki.md"):
+            with open(os.path.join(ROOT, name), "r", encoding="utf-8") as f:
+                self.check_same_source(f.read())
+
+    def test_odd_names(self):
+        self.check_same_source(ODD_NAMES)
+
+    def test_quote_matches_graphviz(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")     # graphviz warns about a trailing backslash
+            for identifier in ("", "spam", "spam spam", "-4.2", ".42", "1a", "<<b>x</b>>", '"', '\\"', '\\\\"',
+                               '\\\\\\"', "node", "Graph", 'a"b\\c', "x\ny", "é"):
+                self.assertEqual(quote(identifier), graphviz_quote(identifier), identifier)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from benchmarks.generator import generate_document
+from src.lint import check_markdown
+from src.parser.markdown_parser import parse_markdown
+
+
+class GenerateDocumentTest(unittest.TestCase):
+
+    def test_options_are_parsed(self):
+        diagram = parse_markdown(generate_document(30, cluster_depth=2, clusters=4))
+        self.assertEqual(len(diagram.nodes), 30)
+        # Every third node has a colour
+        self.assertEqual([key for key, node in diagram.nodes.items() if node.color],
+                         [f"n{i}" for i in range(0, 30, 3)])
+        self.assertTrue(all(node.cluster for node in diagram.nodes.values()))
+
+    def test_no_dangling_references(self):
+        issues = check_markdown(generate_document(50))
+        self.assertEqual([issue for issue in issues if issue.code == "dangling-reference"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
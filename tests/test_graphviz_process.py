@@ -0,0 +1,66 @@
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import graphviz
+from src.profiling import Profile
+from src.renderer.graphviz_process import GraphvizTimeout, pipe_stream, pipe_with_fallback
+
+# Stands in for the dot binary: the engine (-K) decides how it behaves
+FAKE_DOT = """#!{python}
+import sys, time
+sys.stdin.read()
+engine = next(arg[2:] for arg in sys.argv if arg.startswith("-K"))
+if engine == "slow":
+    time.sleep(5)
+out = sys.stdout.buffer
+out.write(b"<svg>")
+out.flush()
+if engine == "trickle":
+    # Output has started (the layout is done); the rest takes a while
+    time.sleep(0.6)
+out.write(b"</svg>")
+"""
+
+
+@unittest.skipIf(os.name != "posix", "needs an executable script")
+class PipeStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        binary = os.path.join(self.tmp, "dot")
+        with open(binary, "w", encoding="utf-8") as f:
+            f.write(FAKE_DOT.format(python=sys.executable))
+        os.chmod(binary, os.stat(binary).st_mode | stat.S_IXUSR)
+        patcher = mock.patch.object(graphviz, "DOT_BINARY", binary)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_output(self):
+        self.assertEqual(b"".join(pipe_stream(["digraph {", "}"], "dot")), b"<svg></svg>")
+
+    def test_timeout_only_covers_the_layout(self):
+        # The first bytes stop the timer even though the output is far from a full chunk
+        self.assertEqual(b"".join(pipe_stream("digraph {}", "trickle", timeout=0.3)), b"<svg></svg>")
+
+    def test_timeout(self):
+        with self.assertRaises(GraphvizTimeout):
+            list(pipe_stream("digraph {}", "slow", timeout=0.3))
+
+    def test_fallback_is_logged_and_counted(self):
+        profile = Profile()
+        with mock.patch.dict("src.renderer.graphviz_process.FALLBACK_ENGINES", {"slow": "dot"}), \
+                self.assertLogs("src.renderer.graphviz_process", "WARNING") as logs:
+            output = b"".join(pipe_with_fallback("digraph {}", "slow", timeout=0.3, profile=profile))
+        self.assertEqual(output, b"<svg></svg>")
+        self.assertEqual(profile.counts["layout_fallbacks"], 1)
+        self.assertIn("falling back to dot", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from src.renderer.image_cache import ImageCache
+
+LAST_MODIFIED = "Mon, 05 Oct 2026 10:00:00 GMT"
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """Serves server.images[path] with an ETag, answering 304 to a matching If-None-Match."""
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("If-None-Match")))
+        content = self.server.images.get(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+        etag = f'"{len(content)}-{content[:4].hex()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class ImageCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+        cls.server.images = {}
+        cls.server.requests = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.images.clear()
+        self.server.images.update({"/a.png": b"A" * 100, "/b.png": b"B" * 100, "/c.png": b"C" * 100})
+        self.server.requests.clear()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def cache(self, **settings) -> ImageCache:
+        return ImageCache(self.cache_dir, **settings)
+
+    def read_index(self) -> dict:
+        with open(os.path.join(self.cache_dir, "index.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_miss_then_hit(self):
+        cache = self.cache()
+        path = cache.get(self.base + "/a.png")
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"A" * 100)
+        self.assertEqual(cache.get(self.base + "/a.png"), path)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual((cache.downloads, cache.bytes_downloaded), (1, 100))
+        # A new cache on the same directory hits too
+        self.assertEqual(self.cache().get(self.base + "/a.png"), path)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_same_content_is_stored_once(self):
+        self.server.images["/copy.png"] = b"A" * 100
+        cache = self.cache()
+        self.assertEqual(cache.get(self.base + "/a.png"), cache.get(self.base + "/copy.png"))
+
+    def test_revalidation(self):
+        cache = self.cache(max_age=0)
+        path = cache.get(self.base + "/a.png")
+        self.assertEqual(cache.get(self.base + "/a.png"), path)
+        self.assertEqual(self.server.requests[1], ("/a.png", '"100-41414141"'))
+        self.assertEqual(cache.bytes_downloaded, 100)   # The 304 has no body
+        self.assertEqual(self.read_index()[self.base + "/a.png"]["last_modified"], LAST_MODIFIED)
+
+        # Changed on the server: the validator no longer matches
+        self.server.images["/a.png"] = b"Z" * 50
+        changed = cache.get(self.base + "/a.png")
+        self.assertNotEqual(changed, path)
+        with open(changed, "rb") as f:
+            self.assertEqual(f.read(), b"Z" * 50)
+
+    def test_eviction_of_least_recently_used(self):
+        cache = self.cache(max_bytes=250)
+        a = cache.get(self.base + "/a.png")
+        b = cache.get(self.base + "/b.png")
+        cache.get(self.base + "/a.png")     # b is now the least recently used
+        c = cache.get(self.base + "/c.png")
+        self.assertTrue(os.path.isfile(a))
+        self.assertFalse(os.path.isfile(b))
+        self.assertTrue(os.path.isfile(c))
+        self.assertEqual(set(self.read_index()), {self.base + "/a.png", self.base + "/c.png"})
+
+    def test_changed_content_replaces_the_old_blob(self):
+        cache = self.cache(max_age=0, max_bytes=1000)
+        os.makedirs(cache.variants_dir)
+        old_paths = []
+        for version in range(10):
+            self.server.images["/a.png"] = bytes([65 + version]) * 400
+            path = cache.get(self.base + "/a.png")
+            variant = os.path.join(cache.variants_dir, f"{cache.content_hash(self.base + '/a.png')}_10x10.png")
+            with open(variant, "wb") as f:
+                f.write(b"v")
+            old_paths += [path, variant]
+        self.assertEqual(len(cache.entries), 1)
+        self.assertEqual([p for p in old_paths if os.path.exists(p)], old_paths[-2:])
+        blobs = [name for name in os.listdir(self.cache_dir) if name.endswith(".png")]
+        self.assertEqual(len(blobs), 1)
+
+    def test_shared_content_is_kept_when_one_url_changes(self):
+        self.server.images["/copy.png"] = b"A" * 100
+        cache = self.cache(max_age=0)
+        shared = cache.get(self.base + "/a.png")
+        cache.get(self.base + "/copy.png")
+        self.server.images["/a.png"] = b"Z" * 100
+        cache.get(self.base + "/a.png")
+        self.assertTrue(os.path.isfile(shared))
+
+    def test_hits_are_written_on_flush(self):
+        cache = self.cache()
+        cache.get(self.base + "/a.png")
+        used = self.read_index()[self.base + "/a.png"]["last_used"]
+        cache.entries[self.base + "/a.png"]["last_used"] = used - 10
+        cache.get(self.base + "/a.png")
+        self.assertEqual(self.read_index()[self.base + "/a.png"]["last_used"], used)
+        cache.flush()
+        self.assertEqual(self.read_index()[self.base + "/a.png"]["last_used"], cache.entries[self.base + "/a.png"]["last_used"])
+
+    def test_offline(self):
+        self.cache().get(self.base + "/a.png")
+        offline = self.cache(offline=True, max_age=0)
+        self.assertTrue(os.path.isfile(offline.get(self.base + "/a.png")))
+        with self.assertRaises(FileNotFoundError):
+            offline.get(self.base + "/b.png")
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_missing_image_raises(self):
+        with self.assertRaises(requests.HTTPError):
+            self.cache().get(self.base + "/missing.png")
+
+
+if __name__ == "__main__":
+    unittest.main()
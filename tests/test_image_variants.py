@@ -0,0 +1,102 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from src.renderer import image_variants
+from src.renderer.image_cache import ImageCache
+from src.renderer.image_variants import downscale_image, pixel_size
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def png_bytes(width: int, height: int) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), (25, 118, 210)).save(out, "PNG")
+    return out.getvalue()
+
+
+class PixelSizeTest(unittest.TestCase):
+
+    def test_pixel_size(self):
+        self.assertEqual(pixel_size(None, None, 96), (96, 96))
+        self.assertEqual(pixel_size("0.5", "2", 100), (50, 200))
+        self.assertEqual(pixel_size("0.001", "0.001", 72), (1, 1))
+
+
+@unittest.skipIf(Image is None, "Pillow is not installed")
+class DownscaleImageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.variants_dir = os.path.join(self.tmp, "variants")
+
+    def write(self, name: str, content: bytes) -> str:
+        path = os.path.join(self.tmp, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_large_image_is_downscaled_once(self):
+        path = self.write("big.png", png_bytes(400, 200))
+        variant = downscale_image(path, (100, 100), self.variants_dir, "abc")
+        self.assertEqual(os.path.basename(variant), "abc_100x100.png")
+        with Image.open(variant) as image:
+            self.assertEqual(image.size, (100, 50))
+        # With the digest given, the source is not hashed; the variant is reused
+        with mock.patch.object(image_variants.hashlib, "sha256", side_effect=AssertionError("hashed")):
+            mtime = os.path.getmtime(variant)
+            self.assertEqual(downscale_image(path, (100, 100), self.variants_dir, "abc"), variant)
+            self.assertEqual(os.path.getmtime(variant), mtime)
+
+    def test_digest_defaults_to_the_content_hash(self):
+        content = png_bytes(300, 300)
+        variant = downscale_image(self.write("big.png", content), (30, 30), self.variants_dir)
+        self.assertTrue(os.path.basename(variant).startswith(hashlib.sha256(content).hexdigest() + "_"))
+
+    def test_small_and_unreadable_images_are_kept(self):
+        small = self.write("small.png", png_bytes(10, 10))
+        self.assertEqual(downscale_image(small, (100, 100), self.variants_dir, "s"), small)
+        svg = self.write("icon.svg", b"<svg/>")
+        self.assertEqual(downscale_image(svg, (10, 10), self.variants_dir, "v"), svg)
+
+
+@unittest.skipIf(Image is None, "Pillow is not installed")
+class VariantEvictionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def add(self, cache: ImageCache, url: str, content: bytes, last_used: float) -> str:
+        """Puts content in the cache under url, as a download would."""
+        response = mock.Mock(headers={})
+        entry = cache._store(url, content, response)
+        entry["validated"] = entry["last_used"] = last_used
+        cache.entries[url] = entry
+        return cache._blob_path(entry)
+
+    def test_variants_count_and_go_with_their_blob(self):
+        big = png_bytes(400, 400)
+        cache = ImageCache(self.tmp, max_bytes=len(big) + 200)
+        old = self.add(cache, "http://x/old.png", big, 1)
+        variant = downscale_image(old, (50, 50), cache.variants_dir, cache.content_hash("http://x/old.png"))
+        self.assertNotEqual(variant, old)
+        self.add(cache, "http://x/new.png", b"N" * 100, 2)
+
+        # The blobs alone fit in max_bytes; with the variant they do not
+        cache._evict(keep="http://x/new.png")
+        self.assertEqual(list(cache.entries), ["http://x/new.png"])
+        self.assertFalse(os.path.exists(old))
+        self.assertFalse(os.path.exists(variant))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from src.parser.incremental_parser import IncrementalParser
+from src.parser.markdown_parser import parse_markdown
+
+from tests.test_markdown_parser import snapshot
+
+BLOCK_A = "# {A} [a]\n## VAR\n- x: int\n## END VAR\n## F_RELA\n- TO [b] {uses}\n## END F_RELA\n\n"
+BLOCK_B = "# {B} [b]\n## F_RELA\n- TO [c] {calls}\n## END F_RELA\n\n"
+BLOCK_C = "# {C} [c]\n### OPT COLOR 00FF00\n\n"
+STYLESHEET = "### STYLESHEET styles/a.css\n### STYLESHEET\n.a { x: y }\n### END STYLESHEET\n\n"
+
+
+class IncrementalParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = IncrementalParser()
+
+    def update(self, text: str):
+        diagram = self.parser.update(text)
+        # Whatever was reused, the result is what a full parse gives
+        self.assertEqual(snapshot(diagram), snapshot(parse_markdown(text)))
+        return diagram
+
+    def test_one_edited_block_is_reparsed(self):
+        first = self.update(STYLESHEET + BLOCK_A + BLOCK_B + BLOCK_C)
+        total = self.parser.blocks_total
+        self.assertEqual(self.parser.blocks_reparsed, total)
+
+        diagram = self.update(STYLESHEET + BLOCK_A + BLOCK_B.replace("calls", "invokes") + BLOCK_C)
+        self.assertIs(diagram, first)
+        self.assertEqual((self.parser.blocks_total, self.parser.blocks_reparsed), (total, 1))
+        self.assertEqual([r.label for r in diagram.relations], ["uses", "invokes"])
+
+        self.update(STYLESHEET + BLOCK_A + BLOCK_B.replace("calls", "invokes") + BLOCK_C)
+        self.assertEqual(self.parser.blocks_reparsed, 0)
+
+    def test_stylesheet_changes(self):
+        diagram = self.update(STYLESHEET + BLOCK_A)
+        self.update(STYLESHEET.replace("a.css", "b.css").replace(".a", ".b") + BLOCK_A)
+        self.assertEqual((diagram.stylesheet, diagram.inline_stylesheet), ("styles/b.css", ".b { x: y }"))
+        self.update(BLOCK_A)
+        self.assertEqual((diagram.stylesheet, diagram.inline_stylesheet), (None, None))
+
+    def test_removed_block_drops_its_node_and_relations(self):
+        diagram = self.update(BLOCK_A + BLOCK_B + BLOCK_C)
+        self.update(BLOCK_A + BLOCK_C)
+        self.assertEqual(list(diagram.nodes), ["a", "c"])
+        self.assertEqual([(r.source_key, r.target_key) for r in diagram.relations], [("a", "b")])
+        self.assertEqual(self.parser.blocks_reparsed, 0)
+
+    def test_duplicate_blocks_are_parsed_once(self):
+        self.update(BLOCK_A + BLOCK_A + BLOCK_C)
+        self.assertEqual((self.parser.blocks_total, self.parser.blocks_reparsed), (3, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.renderer.layout_positions import LayoutPositions
+
+
+class LayoutPositionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, "layout.json")
+
+    def write(self, path: str, data):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data if isinstance(data, str) else json.dumps(data))
+
+    def test_missing_file_starts_empty(self):
+        self.assertEqual(LayoutPositions(self.path).positions, {})
+
+    def test_round_trip(self):
+        self.write(self.path, {"a": [1, 2.5]})
+        positions = LayoutPositions(self.path)
+        self.assertEqual(positions.attributes("neato"), {"a": "1.000,2.500"})
+        self.assertEqual(positions.attributes("fdp", pin=True), {"a": "1.000,2.500!"})
+        self.assertEqual(positions.attributes("dot"), {})
+        positions.save()
+        self.assertEqual(LayoutPositions(self.path).positions, {"a": (1.0, 2.5)})
+
+    def test_malformed_files_are_rejected(self):
+        for data in ("{not json", [1, 2], {"a": "1,2"}, {"a": [1]}, {"a": ["1", "2"]}, {"a": [True, 2]},
+                     {"a": [float("nan"), 0]}, "null"):
+            with self.subTest(data=data):
+                self.write(self.path, data)
+                with self.assertRaisesRegex(ValueError, "layout.json"):
+                    LayoutPositions(self.path)
+
+    def test_update_keeps_hidden_and_drops_removed_nodes(self):
+        self.write(self.path, {"hidden": [1, 1], "removed": [2, 2], "a": [3, 3]})
+        graphviz_json = os.path.join(self.tmp, "out.json")
+        self.write(graphviz_json, {"objects": [{"name": "cluster_c_0", "bb": "0,0,10,10"},
+                                               {"name": "a", "pos": "72,144"},
+                                               {"name": "cluster Core", "pos": "0,36"}]})
+        positions = LayoutPositions(self.path)
+        positions.update_from_json(graphviz_json, keep={"a", "hidden"})
+        self.assertEqual(positions.positions, {"hidden": (1.0, 1.0), "a": (1.0, 2.0), "cluster Core": (0.0, 0.5)})
+
+
+if __name__ == "__main__":
+    unittest.main()
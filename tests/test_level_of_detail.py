@@ -0,0 +1,95 @@
+import unittest
+from unittest import mock
+
+from src.domain import graph_index as graph_index_module
+from src.domain.graph_index import graph_index
+from src.parser.incremental_parser import IncrementalParser
+from src.parser.markdown_parser import parse_markdown
+from src.renderer.level_of_detail import AggregateRelation, ClusterSummary, apply_focus, apply_level_of_detail
+from src.server import RenderService
+
+# a -> b -> c -> d, and e on its own; a, b and c share a cluster styled by a
+CHAIN = ("# {A} [a]\n### OPT CLUSTER Core [style=dashed, color=#112233]\n## F_RELA\n- TO [b] {ab}\n## END F_RELA\n"
+         "# {B} [b]\n### OPT CLUSTER Core\n## F_RELA\n- TO [c] {bc}\n- TO [a] {ba}\n## END F_RELA\n"
+         "# {C} [c]\n### OPT CLUSTER Core\n## F_RELA\n- TO [d] {cd}\n## END F_RELA\n"
+         "# {D} [d]\n# {E} [e]\n")
+
+
+def relations(diagram) -> list:
+    return [relation.label for relation in diagram.relations]
+
+
+class FocusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.diagram = parse_markdown(CHAIN)
+
+    def test_neighbourhood_in_diagram_order(self):
+        result = apply_focus(self.diagram, {"focus": "c", "focus_depth": 1})
+        self.assertEqual(list(result.nodes), ["b", "c", "d"])
+        self.assertEqual(relations(result), ["bc", "cd"])
+
+    def test_directions(self):
+        self.assertEqual(list(apply_focus(self.diagram, {"focus": "b", "focus_depth": 5, "focus_direction": "out"}).nodes),
+                         ["a", "b", "c", "d"])
+        self.assertEqual(list(apply_focus(self.diagram, {"focus": "c", "focus_depth": 5, "focus_direction": "in"}).nodes),
+                         ["a", "b", "c"])
+        self.assertEqual(list(apply_focus(self.diagram, {"focus": "e"}).nodes), ["e"])
+
+    def test_cluster_keeps_its_style(self):
+        # a styles the cluster; without it, b carries its attributes
+        result = apply_focus(self.diagram, {"focus": "c", "focus_depth": 1})
+        self.assertEqual((result.nodes["b"].cluster_style, result.nodes["b"].cluster_color), ("dashed", "#112233"))
+        self.assertIsNone(self.diagram.nodes["b"].cluster_style)
+
+    def test_errors(self):
+        with self.assertRaisesRegex(ValueError, "unknown focus"):
+            apply_focus(self.diagram, {"focus": "zz"})
+        with self.assertRaisesRegex(ValueError, "direction"):
+            apply_focus(self.diagram, {"focus": "a", "focus_direction": "up"})
+
+    def test_index_is_built_once(self):
+        self.assertIs(graph_index(self.diagram), graph_index(self.diagram))
+        with mock.patch.object(graph_index_module, "GraphIndex", side_effect=AssertionError("rebuilt")):
+            apply_focus(self.diagram, {"focus": "a"})
+            apply_focus(self.diagram, {"focus": "d", "focus_depth": 2})
+
+    def test_index_follows_incremental_edits(self):
+        # Same counts before and after: only the relation target changes
+        parser = IncrementalParser()
+        before = "# {A} [a]\n## F_RELA\n- TO [b]\n## END F_RELA\n# {B} [b]\n# {C} [c]\n"
+        diagram = parser.update(before)
+        self.assertEqual(list(apply_level_of_detail(diagram, {"focus": "a"}).nodes), ["a", "b"])
+        self.assertIs(parser.update(before.replace("TO [b]", "TO [c]")), diagram)
+        result = apply_level_of_detail(diagram, {"focus": "a"})
+        self.assertEqual(list(result.nodes), ["a", "c"])
+        self.assertEqual([(r.source_key, r.target_key) for r in result.relations], [("a", "c")])
+
+
+class CollapseTest(unittest.TestCase):
+
+    def test_collapsed_cluster(self):
+        result = apply_level_of_detail(parse_markdown(CHAIN), {"max_depth": 0})
+        self.assertEqual(list(result.nodes), ["cluster Core", "d", "e"])
+        summary = result.nodes["cluster Core"]
+        self.assertIsInstance(summary, ClusterSummary)
+        self.assertEqual(summary.size, 3)
+        # One crossing relation keeps its label; the ones inside the cluster are dropped
+        self.assertEqual(relations(result), ["cd"])
+        self.assertNotIsInstance(result.relations[0], AggregateRelation)
+
+
+class DocumentSnapshotTest(unittest.TestCase):
+
+    def test_same_text_reuses_the_parsed_diagram(self):
+        service = RenderService({}, max_graphviz=1, max_queue=1)
+        first = service.render(CHAIN, "dot", {"focus": "a"}, document="doc")
+        with mock.patch.object(graph_index_module, "GraphIndex", side_effect=AssertionError("rebuilt")):
+            service.render(CHAIN, "dot", {"focus": "d"}, document="doc")
+        self.assertEqual(service.render(CHAIN, "dot", {"focus": "a"}, document="doc"), first)
+        changed = service.render(CHAIN + "# {F} [f]\n", "dot", document="doc")
+        self.assertIn(b"F", changed)
+
+
+if __name__ == "__main__":
+    unittest.main()
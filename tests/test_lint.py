@@ -0,0 +1,39 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+import main
+from src.lint import ERROR, WARNING, check_markdown
+
+
+def codes(markdown_text: str) -> list:
+    return [(issue.severity, issue.code, issue.key) for issue in check_markdown(markdown_text)]
+
+
+class CheckMarkdownTest(unittest.TestCase):
+
+    def test_clean_document(self):
+        self.assertEqual(codes("# {A} [a]\n## F_RELA\n- TO [b]\n## END F_RELA\n# {B} [b]\n"), [])
+
+    def test_dangling_reference_and_duplicate_key(self):
+        self.assertEqual(codes("# {A} [a]\n## F_RELA\n- TO [x]\n## END F_RELA\n# {A again} [a]\n"),
+                         [(ERROR, "dangling-reference", "a"), (ERROR, "duplicate-key", "a")])
+
+    def test_isolated_node(self):
+        # Only nodes with no relation at all are flagged, not ones a relation leaves from
+        self.assertEqual(codes("# {A} [a]\n## F_RELA\n- TO [b]\n## END F_RELA\n# {B} [b]\n# {C} [c]\n"),
+                         [(WARNING, "isolated", "c")])
+
+
+class CheckCommandTest(unittest.TestCase):
+
+    def test_missing_batch_directory_fails(self):
+        out = io.StringIO()
+        with mock.patch("sys.argv", ["main.py", "--check", "--batch", "/no/such/dir"]), redirect_stdout(out):
+            self.assertEqual(main.main(), 1)
+        self.assertIn("does not exist", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
+
+import main
+
+
+class MainTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.document = os.path.join(self.tmp, "doc.md")
+        with open(self.document, "w", encoding="utf-8") as f:
+            f.write("# {A} [a]\n")
+
+    def run_main(self, *args) -> tuple:
+        argv = ["main.py", self.document, "--image-cache", os.path.join(self.tmp, "images"), *args]
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with mock.patch("sys.argv", argv), mock.patch.object(main, "render_file", return_value=["out.svg"]) as render, \
+                redirect_stdout(stdout), redirect_stderr(stderr):
+            main.main()
+        self.options = render.call_args[0][3]
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_report_on_stdout_is_plain_json(self):
+        stdout, stderr = self.run_main("--profile", "-")
+        self.assertEqual(json.loads(stdout)["output"], ["out.svg"])
+        self.assertEqual(stderr, "Diagram generated at: out.svg\n")
+
+    def test_status_line_on_stdout_otherwise(self):
+        report = os.path.join(self.tmp, "report.json")
+        stdout, stderr = self.run_main("--profile", report)
+        self.assertEqual((stdout, stderr), ("Diagram generated at: out.svg\n", ""))
+        with open(report, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["file"], self.document)
+
+
+
+    def test_depth_is_an_alias_of_focus_depth(self):
+        self.run_main("--focus", "a", "--depth", "3")
+        self.assertEqual(self.options["focus_depth"], 3)
+        self.run_main("--focus", "a", "--focus-depth", "2")
+        self.assertEqual(self.options["focus_depth"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
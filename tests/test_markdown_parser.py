@@ -0,0 +1,104 @@
+"""Golden tests: the line-based parser against the regex parser it replaced.
+
+tests/golden/<file>.json is what the original regex parser (the first commit
+of the repository) made of <file>. When an example diagram in test.md or
+wiki.md changes, regenerate the file from that parser rather than from the
+current one, so the comparison stays meaningful.
+"""
+import json
+import os
+import unittest
+
+from src.parser.markdown_parser import parse_markdown
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_DIR = os.path.join(ROOT, "tests", "golden")
+
+NODE_FIELDS = ("key", "name", "variables", "functions", "color", "image", "shape", "css_class", "description",
+               "cluster", "cluster_path", "cluster_class", "cluster_color", "cluster_style", "cluster_bgcolor")
+RELATION_FIELDS = ("source_key", "target_key", "label", "style", "color", "css_class", "arrowhead", "arrowtail", "dir")
+
+# Where the line-based parser deliberately differs from the regex one, by file.
+# wiki.md shows a STYLESHEET block indented inside a code fence; the regex
+# parser only recognised unindented markers, so it:
+# - took the first CSS line after "### STYLESHEET" as the stylesheet file
+#   ("^### STYLESHEET\s+(.+)$" lets \s+ run over the newline), and
+# - ran the inline stylesheet on to the next unindented END marker, swallowing
+#   half of the page.
+INTENDED_DIFFERENCES = {
+    "wiki.md": {
+        "stylesheet": "path/to/my-styles.css",
+        "inline_stylesheet": "/* This CSS will be embedded in the SVG */\n"
+                             "    .entity rect { fill: #e8f0ff; }\n"
+                             "    .highlight path { stroke: #d9534f; stroke-width: 2.5px; }\n"
+                             "    g.cluster.core > polygon { stroke: #4A90E2; fill: #EAF2FF; }",
+    },
+}
+
+
+def snapshot(diagram) -> dict:
+    """Everything the parser fills in, as plain JSON values."""
+    return {
+        "nodes": [{field: getattr(node, field) for field in NODE_FIELDS} for node in diagram.nodes.values()],
+        "relations": [{field: getattr(relation, field) for field in RELATION_FIELDS} for relation in diagram.relations],
+        "stylesheet": diagram.stylesheet,
+        "inline_stylesheet": diagram.inline_stylesheet,
+    }
+
+
+class GoldenParseTest(unittest.TestCase):
+
+    def check_golden(self, name: str):
+        with open(os.path.join(ROOT, name), "r", encoding="utf-8") as f:
+            diagram = parse_markdown(f.read())
+        with open(os.path.join(GOLDEN_DIR, name + ".json"), "r", encoding="utf-8") as f:
+            expected = json.load(f)
+        expected.update(INTENDED_DIFFERENCES.get(name, {}))
+        actual = json.loads(json.dumps(snapshot(diagram)))   # tuples -> lists, like the golden file
+        self.assertEqual(expected["nodes"], actual["nodes"])
+        self.assertEqual(expected["relations"], actual["relations"])
+        self.assertEqual(expected["stylesheet"], actual["stylesheet"])
+        self.assertEqual(expected["inline_stylesheet"], actual["inline_stylesheet"])
+
+    def test_test_md(self):
+        self.check_golden("test.md")
+
+    def test_wiki_md(self):
+        self.check_golden("wiki.md")
+
+    def test_compact_relations_match(self):
+        with open(os.path.join(ROOT, "wiki.md"), "r", encoding="utf-8") as f:
+            text = f.read()
+        self.assertEqual(snapshot(parse_markdown(text)), snapshot(parse_markdown(text, compact_relations=True)))
+
+
+class IntendedDifferencesTest(unittest.TestCase):
+    """Documents that the regex parser handled differently, on purpose."""
+
+    def test_sections_after_blank_lines(self):
+        # The regex parser only took sections that followed each other directly;
+        # blank lines between the parts of a block are now allowed
+        diagram = parse_markdown("# {A} [a]\n### OPT COLOR FF0000\n\n## VAR\n- x: int\n## END VAR\n\n"
+                                 "## F_RELA\n- TO [b] {uses}\n## END F_RELA\n\n# {B} [b]\n")
+        self.assertEqual(diagram.nodes["a"].variables, ["x: int"])
+        self.assertEqual([(r.source_key, r.target_key, r.label) for r in diagram.relations], [("a", "b", "uses")])
+
+    def test_prose_closes_a_block(self):
+        diagram = parse_markdown("# {A} [a]\nSome prose.\n## VAR\n- x: int\n## END VAR\n")
+        self.assertEqual(diagram.nodes["a"].variables, [])
+
+    def test_stylesheet_file_and_inline_block(self):
+        diagram = parse_markdown("### STYLESHEET styles/a.css\n### STYLESHEET styles/b.css\n"
+                                 "  ### STYLESHEET\n  .a { x: y }\n  ### END STYLESHEET\n# {A} [a]\n")
+        # The first of each kind wins; indented markers count
+        self.assertEqual(diagram.stylesheet, "styles/a.css")
+        self.assertEqual(diagram.inline_stylesheet, ".a { x: y }")
+        self.assertEqual(list(diagram.nodes), ["a"])
+
+    def test_header_inside_stylesheet_is_css(self):
+        diagram = parse_markdown("### STYLESHEET\n# {Not} [node]\n### END STYLESHEET\n")
+        self.assertEqual(diagram.nodes, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from src.parser import parallel_parser
+from src.parser.markdown_parser import parse_markdown
+from src.parser.parallel_parser import _stylesheet_blocks, chunk_offsets, parse_file_parallel
+
+from tests.test_markdown_parser import snapshot
+
+STYLESHEET = "### STYLESHEET\n# {Not} [node0]\n.a { x: y }\n# {Nor} [node1]\n### END STYLESHEET\n"
+
+
+def node_block(i: int) -> str:
+    return (f"# {{Node {i}}} [n{i}]\n### OPT COLOR FF000{i % 10}\n## VAR\n- v{i}: int\n## END VAR\n"
+            f"## F_RELA\n- TO [n{(i + 1) % 12}] {{next}}\n## END F_RELA\n\n")
+
+
+def document() -> str:
+    """Headers inside an inline stylesheet, duplicate keys, and enough blocks to chunk."""
+    blocks = [node_block(i) for i in range(12)]
+    blocks.insert(5, STYLESHEET)
+    blocks.append("# {Node 3 again} [n3]\n## VAR\n- w: str\n## END VAR\n")
+    return "".join(blocks)
+
+
+class ParseFileParallelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def write(self, text: str, newline: str = "\n") -> str:
+        path = os.path.join(self.tmp, "doc.md")
+        with open(path, "wb") as f:
+            f.write(text.replace("\n", newline).encode("utf-8"))
+        return path
+
+    def check(self, text: str, newline: str):
+        path = self.write(text, newline)
+        with open(path, "rb") as f:
+            expected = snapshot(parse_markdown(f.read().decode("utf-8")))
+        data = text.replace("\n", newline).encode("utf-8")
+        # Small enough that the document is cut into several chunks
+        with mock.patch.object(parallel_parser, "MIN_CHUNK_SIZE", 64):
+            for chunk_size in (64, 200, 1000):
+                with self.subTest(newline=newline, chunk_size=chunk_size):
+                    self.assertGreater(len(chunk_offsets(data, chunk_size)), 1)
+                    actual = parse_file_parallel(path, workers=2, chunk_size=chunk_size)
+                    self.assertEqual(snapshot(actual), expected)
+
+    def test_matches_parse_markdown(self):
+        self.check(document(), "\n")
+
+    def test_matches_parse_markdown_with_crlf(self):
+        self.check(document(), "\r\n")
+
+    def test_small_and_empty_files(self):
+        self.assertEqual(snapshot(parse_file_parallel(self.write(node_block(1)), workers=4)),
+                         snapshot(parse_markdown(node_block(1))))
+        self.assertEqual(parse_file_parallel(self.write(""), workers=4).nodes, {})
+
+
+class ChunkOffsetsTest(unittest.TestCase):
+
+    def test_offsets_start_at_headers(self):
+        data = document().encode("utf-8")
+        offsets = chunk_offsets(data, 64)
+        self.assertEqual(offsets[0], 0)
+        self.assertEqual(offsets, sorted(set(offsets)))
+        for offset in offsets[1:]:
+            self.assertTrue(data[offset:].startswith(b"# {Node "), data[offset:offset + 20])
+
+    def test_stylesheet_is_not_split(self):
+        data = document().encode("utf-8")
+        (begin, end), = _stylesheet_blocks(data)
+        self.assertEqual(data[begin:end].decode("utf-8") + "\n", STYLESHEET)
+        for chunk_size in range(1, len(data), 7):
+            for offset in chunk_offsets(data, chunk_size):
+                self.assertFalse(begin < offset < end, (chunk_size, offset))
+
+    def test_stylesheet_blocks(self):
+        data = b"### STYLESHEET\r\na\r\n### END STYLESHEET\r\nx\n  ### STYLESHEET\nb\n### END STYLESHEET\n### STYLESHEET\nc\n"
+        first_end = data.index(b"\nx")        # Up to the end of the line, \r included
+        second = data.index(b"  ### STYLESHEET")
+        third = data.rindex(b"### STYLESHEET")  # Unterminated: to the end of the data
+        self.assertEqual(_stylesheet_blocks(data), [(0, first_end), (second, third - 1), (third, len(data))])
+        self.assertEqual(_stylesheet_blocks(b"# {A} [a]\n"), [])
+
+    def test_one_chunk_without_later_headers(self):
+        self.assertEqual(chunk_offsets(b"# {A} [a]\n## VAR\n- x: int\n## END VAR\n", 4), [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from src.parser.markdown_parser import parse_markdown
+from src.pipeline import parse_formats, write_outputs
+from src.renderer import component_layout, graphviz_renderer
+from src.renderer.dot_writer import DotSource
+
+# Two nodes with no relation: two components
+TWO_COMPONENTS = "# {A} [a]\n# {B} [b]\n"
+
+
+def fake_pipe_cached(dot, fmt, options=None, cache=None, outputs=None):
+    """Stands in for Graphviz: one small SVG per layout."""
+    for path in (outputs or {}).values():
+        open(path, "w").close()
+    if fmt:
+        yield b'<svg width="10pt" height="10pt" viewBox="0 0 10 10"><g id="graph0"/></svg>\n'
+
+
+class WriteOutputsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        for module in (graphviz_renderer, component_layout):
+            patcher = mock.patch.object(module, "pipe_cached", fake_pipe_cached)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def render(self, formats, options, dot=None) -> str:
+        output = os.path.join(self.tmp, "out")
+        write_outputs(parse_markdown(TWO_COMPONENTS), output, formats, dict(options, image_cache=mock.Mock()), dot)
+        with open(output + ".svg", "r", encoding="utf-8") as f:
+            return f.read()
+
+    def test_split_components(self):
+        # The packed SVG nests one <svg> per component in an outer one
+        self.assertEqual(self.render(["svg"], {"split_components": True}).count("<svg"), 3)
+        self.assertEqual(self.render(["svg"], {}).count("<svg"), 1)
+
+    def test_split_components_with_dot_output(self):
+        self.assertEqual(self.render(["svg", "dot"], {"split_components": True}).count("<svg"), 3)
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp, "out.dot")))
+
+    def test_split_components_with_a_prepared_dot(self):
+        # watch_file builds the DotSource itself to detect changes
+        dot = DotSource(parse_markdown(TWO_COMPONENTS), {})
+        self.assertEqual(self.render(["svg"], {"split_components": True}, dot).count("<svg"), 3)
+
+    def test_parse_formats(self):
+        self.assertEqual(parse_formats("svg, PNG,svg"), ["svg", "png"])
+        with self.assertRaises(ValueError):
+            parse_formats("svg,gif")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.profiling import Profile
+from src.renderer.svg_postprocess import SvgPostProcessor, write_svg
+
+
+class ProfileTest(unittest.TestCase):
+
+    def test_hooks_receive_increments(self):
+        received = []
+        profile = Profile(hooks=[lambda metric, value: received.append((metric, value))])
+        profile.count("components", 2)
+        profile.count("components", 3)
+        self.assertEqual(received, [("components", 2), ("components", 3)])
+        self.assertEqual(profile.counts["components"], 5)
+
+    def test_timed_chunks_records_once(self):
+        received = []
+        profile = Profile(hooks=[lambda metric, value: received.append(metric)])
+        self.assertEqual(list(profile.timed_chunks("graphviz", [b"a", b"b", b"c"])), [b"a", b"b", b"c"])
+        self.assertEqual(received, ["graphviz_seconds"])
+        self.assertIn("graphviz", profile.report()["phases"])
+
+
+class SvgPostProcessorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.image = os.path.join(self.tmp, "icon.png").replace("\\", "/")
+        with open(self.image, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n" + b"\0" * 8)
+
+    def svg(self) -> bytes:
+        image = f'<image xlink:href="{self.image}" width="72px" height="72px" preserveAspectRatio="xMinYMin meet"/>'
+        return f'<svg width="10pt" height="10pt"><g>{image}{image}</g></svg>\n'.encode("utf-8")
+
+    def test_each_image_is_inlined_once(self):
+        out = io.StringIO()
+        processor = SvgPostProcessor(out)
+        processor.feed(self.svg())
+        processor.close()
+        self.assertEqual(processor.images_inlined, 1)
+        self.assertEqual(processor.inlined_bytes, 16)
+        self.assertEqual(out.getvalue().count("<symbol"), 1)
+        self.assertEqual(out.getvalue().count("<use"), 2)
+
+    def test_write_svg_counts(self):
+        profile = Profile()
+        write_svg([self.svg()], os.path.join(self.tmp, "out.svg"), profile=profile)
+        self.assertEqual(profile.counts["images_inlined"], 1)
+        self.assertEqual(profile.counts["image_bytes_inlined"], 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
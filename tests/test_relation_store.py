@@ -0,0 +1,56 @@
+import copy
+import pickle
+import unittest
+
+from src.domain.relation import Relation
+from src.domain.relation_store import RelationStore
+
+
+def relation(source: str, target: str, label: str = None, **attrs) -> Relation:
+    result = Relation(source, target, label)
+    for name, value in attrs.items():
+        setattr(result, name, value)
+    return result
+
+
+def fields(rel: Relation) -> tuple:
+    return tuple(getattr(rel, field) for field in Relation.__slots__)
+
+
+class RelationStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.relations = [relation("a", "b", "uses", style="dashed", color="#112233"),
+                          relation("b", "a", None, dir="both", arrowtail="dot")]
+        self.store = RelationStore()
+        self.store.extend(self.relations)
+
+    def test_reads_back_every_field(self):
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual([fields(r) for r in self.store], [fields(r) for r in self.relations])
+        self.assertEqual(fields(self.store[-1]), fields(self.relations[1]))
+        with self.assertRaises(IndexError):
+            self.store[2]
+
+    def test_read_relations_are_read_only(self):
+        stored = self.store[0]
+        self.assertIsInstance(stored, Relation)
+        with self.assertRaisesRegex(AttributeError, "read-only"):
+            stored.label = "changed"
+        self.assertEqual(self.store[0].label, "uses")
+
+    def test_clear(self):
+        self.store.clear()
+        self.assertEqual(len(self.store), 0)
+        self.store.append(relation("x", "y", "z"))
+        self.assertEqual(fields(self.store[0]), fields(relation("x", "y", "z")))
+
+    def test_pickles(self):
+        # Chunks parsed by worker processes come back pickled
+        self.assertEqual([fields(r) for r in pickle.loads(pickle.dumps(self.store))],
+                         [fields(r) for r in self.relations])
+        self.assertEqual([fields(r) for r in copy.deepcopy(self.store)], [fields(r) for r in self.relations])
+
+
+if __name__ == "__main__":
+    unittest.main()
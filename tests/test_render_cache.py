@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from src.parser.markdown_parser import parse_markdown
+from src.profiling import Profile
+from src.renderer import render_cache
+from src.renderer.dot_writer import DotSource
+from src.renderer.render_cache import RenderCache, pipe_cached, source_digest
+
+DOCUMENT = "# {A} [a]\n## F_RELA\n- TO [b] {uses}\n## END F_RELA\n# {B} [b]\n"
+
+
+def fake_pipe(source, engine, fmt, timeout, outputs, profile):
+    """Stands in for Graphviz: answers with the DOT it was given."""
+    text = "".join(source)
+    for out_fmt, path in outputs.items():
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(out_fmt + ":" + text)
+    if fmt:
+        yield (fmt + ":" + text).encode("utf-8")
+    return engine
+
+
+def fake_pipe_falling_back(source, engine, fmt, timeout, outputs, profile):
+    """Like fake_pipe, with the layout done by a fallback engine."""
+    yield from fake_pipe(source, engine, fmt, timeout, outputs, profile)
+    return "sfdp"
+
+
+class PipeCachedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        for target, value in (("pipe_with_fallback", fake_pipe), ("graphviz_version", lambda: (9, 0, 0))):
+            patcher = mock.patch.object(render_cache, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def render(self, options=None):
+        options = dict(options or {}, profile=Profile())
+        dot = DotSource(parse_markdown(DOCUMENT), options, {})
+        with mock.patch.object(DotSource, "_lines", side_effect=DotSource._lines, autospec=True) as lines:
+            output = b"".join(pipe_cached(dot, "svg", options, RenderCache(self.cache_dir)))
+        return output, lines.call_count, options["profile"]
+
+    def test_source_is_generated_once(self):
+        output, generated, profile = self.render()
+        self.assertEqual(generated, 1)
+        self.assertEqual(profile.counts["render_cache_misses"], 1)
+        dot = DotSource(parse_markdown(DOCUMENT), {}, {})
+        self.assertEqual(output.decode("utf-8"), "svg:" + dot.source)
+
+        output_again, generated, profile = self.render()
+        self.assertEqual(output_again, output)
+        self.assertEqual(generated, 1)
+        self.assertEqual(profile.counts["render_cache_hits"], 1)
+
+    def test_layout_options_change_the_key(self):
+        self.render()
+        _, _, profile = self.render({"rankdir": "TB"})
+        self.assertEqual(profile.counts["render_cache_misses"], 1)
+
+    def test_timeout_does_not_change_the_key(self):
+        self.render()
+        _, _, profile = self.render({"layout_timeout": 5})
+        self.assertEqual(profile.counts["render_cache_hits"], 1)
+
+    def test_fallback_layout_is_not_cached(self):
+        outputs = {"png": os.path.join(self.cache_dir, "out.png")}
+        dot = DotSource(parse_markdown(DOCUMENT), {}, {})
+        with mock.patch.object(render_cache, "pipe_with_fallback", fake_pipe_falling_back):
+            b"".join(pipe_cached(dot, "svg", {"layout_timeout": 1}, RenderCache(self.cache_dir), outputs))
+        self.assertTrue(os.path.isfile(outputs["png"]))
+        self.assertEqual(os.listdir(self.cache_dir), ["out.png"])
+
+        # The next render runs Graphviz again, and caches its result
+        _, _, profile = self.render({"layout_timeout": 1})
+        self.assertEqual(profile.counts["render_cache_misses"], 1)
+        _, _, profile = self.render({"layout_timeout": 1})
+        self.assertEqual(profile.counts["render_cache_hits"], 1)
+
+    def test_spooled_source(self):
+        pieces = ["digraph {\n", "\ta -> b\n", "}\n"]
+        spooled = render_cache.SpooledSource(iter(pieces))
+        self.assertEqual(spooled.digest, source_digest(pieces))
+        self.assertEqual("".join(spooled), "".join(pieces))
+        self.assertEqual("".join(spooled), "".join(pieces))     # Again, for a fallback engine
+        spooled.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
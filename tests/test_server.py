@@ -0,0 +1,88 @@
+import json
+import threading
+import time
+import unittest
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+from unittest import mock
+
+from src.parser.markdown_parser import parse_markdown
+from src.renderer import component_layout
+from src.server import GraphvizSlots, RenderService, make_handler
+
+SVG = '<svg width="10pt" height="10pt" viewBox="0 0 10 10"><g/></svg>\n'
+
+# Three nodes with no relation between them: three components
+THREE_COMPONENTS = "# {A} [a]\n# {B} [b]\n# {C} [c]\n"
+
+
+class RequestValidationTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.service = RenderService({}, max_graphviz=1, max_queue=1)
+        cls.httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(cls.service))
+        cls.httpd.daemon_threads = True
+        threading.Thread(target=cls.httpd.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+
+    def post(self, request) -> tuple:
+        connection = HTTPConnection(*self.httpd.server_address)
+        try:
+            connection.request("POST", "/render", json.dumps(request), {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            connection.close()
+
+    def test_malformed_requests_are_rejected(self):
+        for request in ([1, 2], "text", {}, {"source": 1},
+                        {"source": "", "options": [1]},
+                        {"source": "", "options": "engine=dot"},
+                        {"source": "", "document": ["a"]},
+                        {"source": "", "format": ["svg"]},
+                        {"source": "", "options": {"bad": 1}},
+                        {"source": "", "options": {"max_depth": -1}}):
+            with self.subTest(request=request):
+                status, body = self.post(request)
+                self.assertEqual(status, 400)
+                self.assertIn("error", body)
+
+    def test_render_validates_its_arguments(self):
+        with self.assertRaises(ValueError):
+            self.service.render("", "dot", overrides=["engine"])
+        with self.assertRaises(ValueError):
+            self.service.render("", "dot", document=3)
+
+
+class SplitComponentSlotsTest(unittest.TestCase):
+
+    def test_each_component_takes_a_slot(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def fake_pipe_cached(dot, fmt, options, cache):
+            with lock:
+                running.append(dot)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(dot)
+            yield SVG.encode("utf-8")
+
+        slots = GraphvizSlots(max_running=1, max_waiting=8)
+        with mock.patch.object(component_layout, "pipe_cached", fake_pipe_cached):
+            chunks = list(component_layout.layout_components(parse_markdown(THREE_COMPONENTS), {}, image_paths={},
+                                                             max_workers=3, graphviz_slot=slots))
+        self.assertEqual(len(peak), 3)
+        self.assertEqual(max(peak), 1)
+        self.assertTrue(b"".join(chunks).startswith(b"<svg"))
+
+
+if __name__ == "__main__":
+    unittest.main()